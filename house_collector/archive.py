@@ -0,0 +1,530 @@
+"""
+Module responsible for archiving the raw payloads fetched from the providers.
+
+The payloads are compressed and appended to segment files, while a fixed size
+index of (provider, id, fetched_at) -> (segment, offset) entries is appended to
+a separate file that is read through mmap. The entries are in append order,
+lookups of a house go through buckets built from the mapped entries.
+This allows running the current parsers over everything that was ever fetched
+without crawling the providers again.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+LOGGER = logging.getLogger("RawArchive")
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".seg"
+INDEX_FILE = "index.idx"
+MAX_SEGMENT_SIZE = 256 * 1024 * 1024
+# Minimum number of records reparsed by a task, every task opens the storage
+MIN_REPARSE_CHUNK = 100
+# Tasks per process, so the processes stay busy until the end
+REPARSE_CHUNKS_PER_PROCESS = 4
+
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+# magic, codec, metadata length, payload length
+RECORD_HEADER = struct.Struct("<4sBII")
+RECORD_MAGIC = b"HCR1"
+
+# provider, digest of the house id, fetched_at, segment, offset
+INDEX_ENTRY = struct.Struct("<16s16sdIQ")
+
+
+class IndexEntry(NamedTuple):
+    """Entry of the archive index"""
+
+    provider: str
+    key: bytes
+    fetched_at: float
+    segment: int
+    offset: int
+
+
+def house_key(house_id) -> bytes:
+    """
+    Get the fixed size digest used to index a house id
+    """
+    return hashlib.blake2b(
+        str(house_id).encode("utf-8"), digest_size=16
+    ).digest()
+
+
+def segment_name(segment: int) -> str:
+    """
+    Get the file name of a segment
+    """
+    return f"{SEGMENT_PREFIX}{segment:06d}{SEGMENT_SUFFIX}"
+
+
+def list_segments(directory: str) -> List[int]:
+    """
+    List the segments of an archive, sorted
+    """
+    segments = []
+    for name in os.listdir(directory):
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+            segments.append(
+                int(name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)])
+            )
+    return sorted(segments)
+
+
+def _compress(payload: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(payload)
+    return zlib.compress(payload, 6)
+
+
+def _decompress(payload: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read this archive")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return zlib.decompress(payload)
+
+
+def read_record(file, offset: int) -> Tuple[dict, str]:
+    """
+    Read a record from an opened segment file
+
+    Args:
+        file: segment file opened in binary mode
+        offset (int): offset of the record
+
+    Returns:
+        Tuple[dict, str]: the metadata and the raw payload of the record
+    """
+    file.seek(offset)
+    header = file.read(RECORD_HEADER.size)
+    magic, codec, meta_len, payload_len = RECORD_HEADER.unpack(header)
+    if magic != RECORD_MAGIC:
+        raise ValueError(f"Invalid record at offset {offset}")
+
+    meta = json.loads(file.read(meta_len))
+    payload = _decompress(file.read(payload_len), codec)
+    return meta, payload.decode("utf-8")
+
+
+class ArchiveIndex:
+    """
+    Read only view of the archive index, memory mapped.
+    The entries are not sorted, so the positions of the entries of every house
+    are bucketed the first time a house is looked up, and only the entries
+    appended since then are bucketed by the next lookups
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._size = 0
+        # (provider, key) -> positions of its entries, in append order
+        self._buckets: Dict[Tuple[bytes, bytes], List[int]] = {}
+        self._bucketed = 0
+        self.refresh()
+
+    def refresh(self):
+        """
+        Map the index again if it has grown since it was mapped
+        """
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        size -= size % INDEX_ENTRY.size
+        if size == self._size:
+            return
+
+        self.close()
+        if size == 0:
+            return
+        # pylint: disable=consider-using-with
+        self._file = open(self.path, "rb")
+        # pylint: enable=consider-using-with
+        self._mmap = mmap.mmap(
+            self._file.fileno(), size, access=mmap.ACCESS_READ
+        )
+        self._size = size
+
+    def __len__(self):
+        return self._size // INDEX_ENTRY.size
+
+    def __getitem__(self, position: int) -> IndexEntry:
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        provider, key, fetched_at, segment, offset = INDEX_ENTRY.unpack_from(
+            self._mmap, position * INDEX_ENTRY.size
+        )
+        return IndexEntry(
+            provider.rstrip(b"\0").decode("utf-8"),
+            key,
+            fetched_at,
+            segment,
+            offset,
+        )
+
+    def __iter__(self) -> Iterator[IndexEntry]:
+        for position in range(len(self)):
+            yield self[position]
+
+    def _update_buckets(self):
+        """
+        Bucket the entries appended since the last lookup
+        """
+        if self._bucketed > len(self):
+            # The index was truncated, bucket it again
+            self._buckets.clear()
+            self._bucketed = 0
+        if self._bucketed == len(self):
+            return
+
+        start = self._bucketed * INDEX_ENTRY.size
+        for position, (provider, key, _, _, _) in enumerate(
+            INDEX_ENTRY.iter_unpack(self._mmap[start : self._size]),
+            self._bucketed,
+        ):
+            self._buckets.setdefault((provider, key), []).append(position)
+        self._bucketed = len(self)
+
+    def find(self, provider: str, house_id) -> List[IndexEntry]:
+        """
+        Get every entry of a house, oldest first
+        """
+        self._update_buckets()
+        # Same padding as the packed provider of the entries
+        bucket = (
+            provider.encode("utf-8")[:16].ljust(16, b"\0"),
+            house_key(house_id),
+        )
+        return [self[position] for position in self._buckets.get(bucket, [])]
+
+    def latest_entries(
+        self, provider: str = None
+    ) -> Dict[Tuple[str, bytes], IndexEntry]:
+        """
+        Get the most recent entry of each house
+
+        Args:
+            provider (str, optional): only return this provider. Defaults to None.
+
+        Returns:
+            Dict[Tuple[str, bytes], IndexEntry]: the entries by (provider, key)
+        """
+        latest: Dict[Tuple[str, bytes], IndexEntry] = {}
+        for entry in self:
+            if provider is not None and entry.provider != provider:
+                continue
+            current = latest.get((entry.provider, entry.key))
+            if current is None or entry.fetched_at >= current.fetched_at:
+                latest[(entry.provider, entry.key)] = entry
+        return latest
+
+    def close(self):
+        """
+        Unmap the index
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._size = 0
+
+
+class RawArchive:
+    """
+    Append only archive of the raw payloads fetched from the providers.
+    Appending is thread safe.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        use_zstd: bool = True,
+        max_segment_size: int = MAX_SEGMENT_SIZE,
+    ):
+        """
+        Constructor
+
+        Args:
+            directory (str): directory of the archive, created if needed
+            use_zstd (bool, optional): compress with zstd when available,
+                otherwise zlib is used. Defaults to True.
+            max_segment_size (int, optional): size after which a new segment is
+                started. Defaults to MAX_SEGMENT_SIZE.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.codec = (
+            CODEC_ZSTD if use_zstd and zstandard is not None else CODEC_ZLIB
+        )
+        self.max_segment_size = max_segment_size
+        self.lock = threading.Lock()
+
+        segments = list_segments(directory)
+        self.segment = segments[-1] if segments else 0
+        # pylint: disable=consider-using-with
+        self._segment_file = open(self._segment_path(self.segment), "ab")
+        self._index_file = open(os.path.join(directory, INDEX_FILE), "ab")
+        # pylint: enable=consider-using-with
+
+        LOGGER.info(
+            "Archive opened at %s on segment %d with codec %d",
+            directory,
+            self.segment,
+            self.codec,
+        )
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, segment_name(segment))
+
+    def append(
+        self,
+        provider: str,
+        house_id,
+        link: str,
+        payload: str,
+        fetched_at: float = None,
+    ) -> Tuple[int, int]:
+        """
+        Append a raw payload to the archive
+
+        Args:
+            provider (str): name of the provider
+            house_id: id of the house
+            link (str): link the payload was fetched from
+            payload (str): raw payload
+            fetched_at (float, optional): unix timestamp of the fetch.
+                Defaults to now.
+
+        Returns:
+            Tuple[int, int]: the segment and offset of the record
+        """
+        if fetched_at is None:
+            fetched_at = time.time()
+
+        meta = json.dumps(
+            {
+                "provider": provider,
+                "id": str(house_id),
+                "link": link,
+                "fetched_at": fetched_at,
+            }
+        ).encode("utf-8")
+        # Compress outside of the lock so threads can compress in parallel
+        compressed = _compress(payload.encode("utf-8"), self.codec)
+        record = (
+            RECORD_HEADER.pack(
+                RECORD_MAGIC, self.codec, len(meta), len(compressed)
+            )
+            + meta
+            + compressed
+        )
+
+        with self.lock:
+            offset = self._segment_file.tell()
+            if offset > 0 and offset + len(record) > self.max_segment_size:
+                self._segment_file.close()
+                self.segment += 1
+                # pylint: disable=consider-using-with
+                self._segment_file = open(
+                    self._segment_path(self.segment), "ab"
+                )
+                # pylint: enable=consider-using-with
+                offset = 0
+
+            # The record is flushed before its index entry so the index
+            # never points to a missing record
+            self._segment_file.write(record)
+            self._segment_file.flush()
+            self._index_file.write(
+                INDEX_ENTRY.pack(
+                    provider.encode("utf-8")[:16],
+                    house_key(house_id),
+                    fetched_at,
+                    self.segment,
+                    offset,
+                )
+            )
+            self._index_file.flush()
+
+        return self.segment, offset
+
+    def open_index(self) -> ArchiveIndex:
+        """
+        Open a memory mapped view of the index
+        """
+        return ArchiveIndex(os.path.join(self.directory, INDEX_FILE))
+
+    def read(self, segment: int, offset: int) -> Tuple[dict, str]:
+        """
+        Read a record of the archive
+
+        Args:
+            segment (int): segment of the record
+            offset (int): offset of the record in the segment
+
+        Returns:
+            Tuple[dict, str]: the metadata and the raw payload
+        """
+        with open(self._segment_path(segment), "rb") as file:
+            return read_record(file, offset)
+
+    def close(self):
+        """
+        Close the archive files
+        """
+        with self.lock:
+            self._segment_file.close()
+            self._index_file.close()
+
+
+def _reparse_records(
+    path: str,
+    offsets: List[int],
+    storage_args: dict,
+) -> Tuple[int, int]:
+    """
+    Reparse some records of a segment and write the houses to the DB.
+    Runs on a worker process
+
+    Returns:
+        Tuple[int, int]: number of houses parsed and number of failures
+    """
+    # pylint: disable=import-outside-toplevel,broad-except
+    from house_collector.normalization import normalize_house
+    from house_collector.registry import load_scrapper
+    from house_collector.storage import EXPIRES_AT_FIELD, create_storage
+
+    scrappers = {}
+    db_handler = create_storage(**storage_args)
+    parsed = failed = 0
+
+    with open(path, "rb") as file:
+        for offset in offsets:
+            try:
+                meta, payload = read_record(file, offset)
+                if meta["provider"] not in scrappers:
+                    scrappers[meta["provider"]] = load_scrapper(
+                        meta["provider"]
+                    )
+                scrapper = scrappers[meta["provider"]]
+                house, date = scrapper.parse_house(payload, meta["link"])
+                house.update(normalize_house(meta["provider"], house))
+                house["date_modified"] = date
+                house["link"] = meta["link"]
+                expiry = scrapper.get_house_expiry(house)
+                if expiry is not None:
+                    house[EXPIRES_AT_FIELD] = expiry
+                if "_id" not in house:
+                    house["_id"] = meta["link"]
+
+                db_handler.insert_house(house, meta["provider"])
+                parsed += 1
+            except Exception:
+                LOGGER.exception("Error reparsing record %s:%d", path, offset)
+                failed += 1
+
+    db_handler.close()
+    # pylint: enable=import-outside-toplevel,broad-except
+    return parsed, failed
+
+
+def reparse_archive(
+    directory: str,
+    db_host: str = None,
+    db_port: int = None,
+    provider: str = None,
+    processes: int = None,
+    storage: str = "mongo",
+    sqlite_path: str = None,
+) -> Tuple[int, int]:
+    """
+    Run the current parsers over the latest archived payload of every house
+    and write the result to the database, using multiple processes
+
+    Args:
+        directory (str): directory of the archive
+        db_host (str): database host
+        db_port (int): database port
+        provider (str, optional): only reparse this provider. Defaults to None.
+        processes (int, optional): number of processes. Defaults to the CPU count.
+        storage (str, optional): storage backend. Defaults to "mongo".
+        sqlite_path (str, optional): database file of the sqlite storage.
+            Defaults to None.
+
+    Returns:
+        Tuple[int, int]: number of houses parsed and number of failures
+    """
+    index = ArchiveIndex(os.path.join(directory, INDEX_FILE))
+    latest = index.latest_entries(provider)
+    index.close()
+
+    # Group the records by segment, in file order
+    by_segment: Dict[int, List[int]] = {}
+    for entry in latest.values():
+        by_segment.setdefault(entry.segment, []).append(entry.offset)
+
+    # Split the segments in chunks, so a small archive is still spread
+    # over every process
+    processes = processes or os.cpu_count() or 1
+    chunk_size = max(
+        MIN_REPARSE_CHUNK,
+        -(-len(latest) // (processes * REPARSE_CHUNKS_PER_PROCESS)),
+    )
+    chunks = []
+    for segment, offsets in by_segment.items():
+        offsets.sort()
+        for start in range(0, len(offsets), chunk_size):
+            chunks.append((segment, offsets[start : start + chunk_size]))
+
+    LOGGER.info(
+        "Reparsing %d houses from %d segments in %d chunks",
+        len(latest),
+        len(by_segment),
+        len(chunks),
+    )
+
+    parsed = failed = 0
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(
+                _reparse_records,
+                os.path.join(directory, segment_name(segment)),
+                offsets,
+                {
+                    "storage_type": storage,
+                    "db_host": db_host,
+                    "db_port": db_port,
+                    "sqlite_path": sqlite_path,
+                },
+            )
+            for segment, offsets in chunks
+        ]
+        for future in futures:
+            segment_parsed, segment_failed = future.result()
+            parsed += segment_parsed
+            failed += segment_failed
+
+    LOGGER.info("Reparsed %d houses, %d failed", parsed, failed)
+    return parsed, failed
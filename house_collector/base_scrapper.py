@@ -3,7 +3,11 @@ This module defines an interface that
 shall be implemented by scrappers
 """
 from datetime import datetime
-from typing import List, Tuple
+from typing import List, Optional, Set, Tuple
+
+# Number of links of the watermark, or of houses older than the newest one
+# stored, to find before an incremental listing stops
+WATERMARK_HITS = 3
 
 
 class House:
@@ -158,6 +162,10 @@ Condition:{self.get_condition()}
 Investment:{self.get_is_investment()}\n"""
 
 
+class HouseUnavailableError(Exception):
+    """Raised by a scrapper when a house is no longer listed by the provider"""
+
+
 class WebsiteScrapper:
     """_summary_"""
 
@@ -166,8 +174,39 @@ class WebsiteScrapper:
         This method should return a House object with the data from the link.
         It must also return the date of the last update of the house ().
         """
+        return self.parse_house(self.get_raw_house(link), link)
+
+    def get_raw_house(self, link: str) -> str:
+        """
+        This method should return the raw payload (HTML, JSON, ...) of the house,
+        exactly as fetched from the provider, so it can be archived and parsed
+        again later with parse_house.
+        It should raise HouseUnavailableError if the house was removed
+        """
         raise NotImplementedError()
 
+    def parse_house(self, raw: str, link: str) -> Tuple[dict, datetime]:
+        """
+        This method should parse a raw payload returned by get_raw_house,
+        the return value is the same as get_house
+        """
+        raise NotImplementedError()
+
+    def get_house_id(self, link: str) -> str:
+        """
+        This method should return the id of the house before it is parsed,
+        by default the link is used as id
+        """
+        return link
+
+    def get_house_expiry(self, house: dict) -> Optional[datetime]:
+        """
+        This method may return when the listing of a parsed house expires,
+        houses past it are marked unavailable without being fetched.
+        By default houses do not expire
+        """
+        return None
+
     def is_get_house_request(self) -> bool:
         """
         This method shall return True if the get_house method uses
@@ -181,14 +220,119 @@ class WebsiteScrapper:
         """
         raise NotImplementedError()
 
+    def get_locations(self) -> List[str]:
+        """
+        This method should return the locations (districts, regions, ...)
+        accepted by get_house_list, which split the search in partitions
+        that can be listed in parallel. By default the search is not split
+        """
+        return []
+
+    def start_listing(self):
+        """
+        This method is called once before the house lists of a run are
+        requested, which can be done from multiple threads
+        """
+
     def get_house_list(
         self,
         location: str = None,
         min_date: datetime = None,
         max_houses: int = 9999999,
+        watermark: Set[str] = None,
     ) -> List[str]:
         """
         This method should return a list of links for each house according to the
-        filters provided, the list should be sorted by date (oldest first)
+        filters provided, the list should be sorted by date (oldest first).
+        If a watermark (links of the newest houses of the previous run) is given,
+        the listing should walk the pages newest first and stop once it reaches
+        the watermark, see IncrementalListing.
+        If a location of get_locations is given, only its houses are listed.
+        Must be thread safe, the locations can be listed in parallel
         """
         raise NotImplementedError()
+
+
+class IncrementalListing:
+    """
+    Collects the links of a listing walked newest first, until the houses
+    of the previous run are reached.
+
+    Promoted houses can show up out of order, so the listing only stops
+    after finding a few links of the watermark instead of the first one.
+    """
+
+    def __init__(
+        self,
+        watermark: Set[str] = None,
+        max_houses: int = 9999999,
+        min_hits: int = WATERMARK_HITS,
+    ):
+        """
+        Constructor
+
+        Args:
+            watermark (Set[str], optional): links of the newest houses of the
+                previous run. Defaults to None.
+            max_houses (int, optional): maximum number of links. Defaults to 9999999.
+            min_hits (int, optional): number of watermark links to find before
+                stopping. Defaults to WATERMARK_HITS.
+        """
+        self.watermark = watermark or set()
+        self.max_houses = max_houses
+        self.min_hits = min(min_hits, len(self.watermark))
+        self.hits = 0
+        self.max_older = min_hits
+        self.older = 0
+        self.done = False
+        self._links: List[str] = []
+        self._seen: Set[str] = set()
+
+    def add(self, link: str) -> bool:
+        """
+        Add a link, newer links must be added first
+
+        Returns:
+            bool: False once the listing should stop
+        """
+        if self.done:
+            return False
+
+        if link in self.watermark:
+            self.hits += 1
+            if self.hits >= self.min_hits:
+                self.done = True
+        elif link not in self._seen:
+            self._seen.add(link)
+            self._links.append(link)
+            if len(self._links) >= self.max_houses:
+                self.done = True
+
+        return not self.done
+
+    def add_older(self) -> bool:
+        """
+        Count a house older than the newest one stored, which is skipped.
+        Promoted houses can show up out of order, so the listing only stops
+        after finding a few of them instead of the first one
+
+        Returns:
+            bool: False once the listing should stop
+        """
+        if not self.done:
+            self.older += 1
+            if self.older >= self.max_older:
+                self.done = True
+        return not self.done
+
+    def stop(self):
+        """
+        Stop the listing, e.g. when houses older than min_date are reached
+        """
+        self.done = True
+
+    def get_links(self) -> List[str]:
+        """
+        Get the links collected, oldest first
+        """
+        return self._links[::-1]
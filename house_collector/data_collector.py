@@ -2,20 +2,54 @@
 Main module responsible for collecting the data from
 the multiple scrappers and send to the database
 """
+import itertools
 import logging
-import math
+import queue
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
-from datetime import timedelta
-from typing import List, Set
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
 
-from house_collector.base_scrapper import WebsiteScrapper
-from house_collector.db_handler import DBHandler
-from house_collector.imovirtual_scrapper import ImovirtualScrapper
-from house_collector.olx_scrapper import OlxScrapper
+from house_collector import profiler
+from house_collector.archive import RawArchive
+from house_collector.base_scrapper import HouseUnavailableError, WebsiteScrapper
+from house_collector.events import create_event_sink
+from house_collector.normalization import normalize_house
+from house_collector.registry import load_scrappers
+from house_collector.search import SearchIndex
+from house_collector.storage import (
+    EXPIRES_AT_FIELD,
+    LAST_CHECKED_FIELD,
+    STORAGE_MONGO,
+    create_storage,
+)
+from house_collector.utils import RetriesExhaustedError
 
-SCRAPPER_LIST: Set[WebsiteScrapper] = {ImovirtualScrapper(), OlxScrapper()}
 LOGGER = logging.getLogger("DataCollector")
+# Number of the newest links saved to stop the next incremental listing
+WATERMARK_SIZE = 20
+# Number of times a house is tried before it is sent to the dead letters
+MAX_ATTEMPTS = 3
+# Seconds between the checks that the workers of a queue are still alive
+JOIN_CHECK_SEC = 1
+
+# Priorities of the houses of a run, lower first
+PRIORITY_NEW = 0
+PRIORITY_PRICE_CHANGE = 1
+PRIORITY_RECHECK = 2
+# Sorted after every house, so the workers stop once the queue is drained
+PRIORITY_STOP = 3
+
+# Houses are checked again after RECHECK_INTERVAL, or after
+# PRICE_CHANGE_RECHECK_INTERVAL if their price changed in RECENT_PRICE_CHANGE
+RECHECK_INTERVAL = timedelta(days=7)
+PRICE_CHANGE_RECHECK_INTERVAL = timedelta(days=1)
+RECENT_PRICE_CHANGE = timedelta(days=14)
+# Maximum number of houses checked again by every run
+MAX_RECHECKS = 1000
+# Number of locations listed at the same time by a partitioned crawl
+PARTITION_THREADS = 8
 
 
 class DataCollector:
@@ -29,20 +63,65 @@ class DataCollector:
     As this is considered a very rare case, this problem was ignored and remains to be fixed in the future.
     """
 
-    def __init__(self, db_host, db_port, max_threads: int = 100, use_threading: bool = True, check_interval_min: int = 30):
+    def __init__(
+        self,
+        db_host,
+        db_port,
+        max_threads: int = 100,
+        use_threading: bool = True,
+        check_interval_min: int = 30,
+        archive_dir: str = None,
+        providers: List[str] = None,
+        search_dir: str = None,
+        event_sink: str = None,
+        replay_dead_letters: bool = False,
+        storage: str = STORAGE_MONGO,
+        sqlite_path: str = None,
+        time_budget_min: float = None,
+        max_rechecks: int = MAX_RECHECKS,
+        partition: bool = False,
+        partition_threads: int = PARTITION_THREADS,
+    ):
         """
         Constructor
 
         Args:
             max_threads (int, optional): The maximum number of threads to be used. Defaults to 100.
+            archive_dir (str, optional): Directory where the raw payloads are archived. Defaults to None (disabled).
+            providers (List[str], optional): Name of the providers to scrap. Defaults to every registered provider.
+            search_dir (str, optional): Directory of the full-text search index. Defaults to None (disabled).
+            event_sink (str, optional): Where to send the house events, see events.create_event_sink. Defaults to None (disabled).
+            replay_dead_letters (bool, optional): Whether to process the dead letters of previous runs again. Defaults to False.
+            storage (str, optional): Storage backend, see storage.STORAGE_TYPES. Defaults to STORAGE_MONGO.
+            sqlite_path (str, optional): Database file of the sqlite storage. Defaults to None.
+            time_budget_min (float, optional): Wall-clock budget of a run, in minutes, the houses left are processed by the next run. Defaults to None (no budget).
+            max_rechecks (int, optional): Maximum number of stored houses checked again by a run. Defaults to MAX_RECHECKS.
+            partition (bool, optional): Whether to list every location of the scrappers separately, see WebsiteScrapper.get_locations. Defaults to False.
+            partition_threads (int, optional): Number of locations listed at the same time. Defaults to PARTITION_THREADS.
         """
-        self.db_handler = DBHandler(host=db_host, port=db_port)
-        self.scrapper_list = SCRAPPER_LIST
+        self.db_handler = create_storage(
+            storage, db_host=db_host, db_port=db_port, sqlite_path=sqlite_path
+        )
+        if event_sink:
+            self.db_handler.event_sink = create_event_sink(
+                event_sink, getattr(self.db_handler, "db_client", None)
+            )
+        self.archive = RawArchive(archive_dir) if archive_dir else None
+        self.search_index = SearchIndex(search_dir) if search_dir else None
+        self.scrapper_list = load_scrappers(providers)
         self.max_threads = max_threads
         self.use_threading = use_threading
         self.check_interval_min = check_interval_min
+        self.replay_dead_letters = replay_dead_letters
+        self.time_budget_min = time_budget_min
+        self.max_rechecks = max_rechecks
+        self.partition = partition
+        self.partition_threads = partition_threads
+        # time.monotonic() when the current run must stop, None without budget
+        self.deadline: Optional[float] = None
 
         LOGGER.info("DataCollector initialized with %d threads and multi-threading=%d", max_threads, use_threading)
+        LOGGER.info("Scrapping providers %s", [scrapper.get_provider_name() for scrapper in self.scrapper_list])
 
     def run(self):
         """
@@ -63,44 +142,364 @@ class DataCollector:
         """
         Run the DataCollector once
         """
+        if self.time_budget_min is not None:
+            self.deadline = time.monotonic() + self.time_budget_min * 60
         for scrapper in self.scrapper_list:
-            self.process_scrapper(scrapper)
+            try:
+                self.process_scrapper(scrapper)
+            except RetriesExhaustedError:
+                # The website is failing, the next run lists it again
+                LOGGER.exception(
+                    "Giving up on %s for this run", scrapper.get_provider_name()
+                )
+
+    def close(self):
+        """
+        Commit the pending writes and close the storage and the archive
+        """
+        self.db_handler.close()
+        if self.archive is not None:
+            self.archive.close()
 
-    def request_pool(self, house_list: List[str], scrapper: WebsiteScrapper):
+    def process_house(self, house_link: str, scrapper: WebsiteScrapper) -> bool:
         """
-        Request a pool of houses from a scrapper
+        Fetch, parse and write a single house
         Thread safe function
 
         Args:
-            house_list (List[str]): List of houses to request
-            scrapper (WebsiteScrapper): Scrapper to request the pool
+            house_link (str): Link of the house
+            scrapper (WebsiteScrapper): Scrapper of the house
+
+        Returns:
+            bool: True if the house was written, False if it is no longer available
+        """
+        provider = scrapper.get_provider_name()
+        LOGGER.debug("Processing house %s", house_link)
+        try:
+            if self.archive is None and not profiler.is_profiling():
+                house, date = scrapper.get_house(house_link)  # type: ignore
+            else:
+                # Archive the raw payload before parsing it, so it can be
+                # parsed again even if the current parser fails
+                with profiler.stage(provider, profiler.STAGE_FETCH):
+                    raw = scrapper.get_raw_house(house_link)
+                if self.archive is not None:
+                    self.archive.append(
+                        provider,
+                        scrapper.get_house_id(house_link),
+                        house_link,
+                        raw,
+                    )
+                with profiler.stage(provider, profiler.STAGE_PARSE):
+                    house, date = scrapper.parse_house(raw, house_link)
+        except HouseUnavailableError:
+            LOGGER.info("House %s is no longer available", house_link)
+            house_id = self.db_handler.set_house_unavailable(
+                house_link, provider
+            )
+            if house_id is not None and self.search_index is not None:
+                self.search_index.remove_house(provider, house_id)
+            return False
+
+        house.update(normalize_house(provider, house))  # type: ignore
+        house["date_modified"] = date  # type: ignore
+        house["link"] = house_link  # type: ignore
+        house["available"] = True  # type: ignore
+        house[LAST_CHECKED_FIELD] = datetime.now(timezone.utc)  # type: ignore
+        expiry = scrapper.get_house_expiry(house)  # type: ignore
+        if expiry is not None:
+            house[EXPIRES_AT_FIELD] = expiry  # type: ignore
+
+        if "_id" not in house:
+            house["_id"] = house_link  # type: ignore
+
+        with profiler.stage(provider, profiler.STAGE_WRITE):
+            self.db_handler.insert_house(house, provider)  # type: ignore
+            if self.search_index is not None:
+                self.search_index.add_house(provider, house)
+        return True
+
+    def house_worker(
+        self,
+        task_queue: queue.PriorityQueue,
+        scrapper: WebsiteScrapper,
+        report: "RunReport",
+        deadline: float = None,
+    ):
+        """
+        Process the houses of a queue, most urgent first, until a
+        PRIORITY_STOP task is found.
+        Failed houses are put back in the queue until they reach
+        MAX_ATTEMPTS, then they are sent to the dead letters.
+        Once the deadline is reached the houses left are deferred
+        Thread safe function
+
+        Args:
+            task_queue (queue.PriorityQueue): Queue of
+                (priority, sequence, link, attempts) tasks
+            scrapper (WebsiteScrapper): Scrapper of the houses
+            report (RunReport): Report of the run
+            deadline (float, optional): time.monotonic() after which no house
+                is started. Defaults to None (no deadline).
+        """
+        # pylint: disable=broad-except
+        while True:
+            priority, _, house_link, attempts = task_queue.get()
+            try:
+                if priority == PRIORITY_STOP:
+                    return
+
+                if deadline is not None and time.monotonic() >= deadline:
+                    report.defer(house_link, priority)
+                    continue
+
+                try:
+                    if self.process_house(house_link, scrapper):
+                        report.add(house_link, RunReport.WRITTEN)
+                    else:
+                        report.add(house_link, RunReport.UNAVAILABLE)
+                except Exception as error:
+                    attempts += 1
+                    if attempts < MAX_ATTEMPTS:
+                        LOGGER.warning(
+                            "Error processing house %s (attempt %d), retrying",
+                            house_link,
+                            attempts,
+                            exc_info=True,
+                        )
+                        report.add(house_link, RunReport.RETRIED)
+                        # Put back before task_done so join() keeps waiting
+                        task_queue.put(
+                            (priority, next(report.sequence), house_link, attempts)
+                        )
+                    else:
+                        LOGGER.exception(
+                            "Error processing house %s, giving up after %d attempts",
+                            house_link,
+                            attempts,
+                        )
+                        self.dead_letter(
+                            house_link, scrapper, repr(error), attempts, report
+                        )
+            except Exception as error:
+                # The worker must survive anything, otherwise the houses left
+                # in the queue are never done and join() blocks forever
+                LOGGER.exception("Unexpected error with house %s", house_link)
+                self.dead_letter(
+                    house_link, scrapper, repr(error), attempts, report
+                )
+            finally:
+                task_queue.task_done()
+        # pylint: enable=broad-except
+
+    def dead_letter(
+        self,
+        house_link: str,
+        scrapper: WebsiteScrapper,
+        error: str,
+        attempts: int,
+        report: "RunReport",
+    ):
+        """
+        Send a house to the dead letters.
+        The house is counted as a dead letter even if it cannot be written,
+        e.g. when the database is down
+        Thread safe function
         """
         # pylint: disable=broad-except
+        try:
+            self.db_handler.insert_dead_letter(
+                house_link, scrapper.get_provider_name(), error, attempts
+            )
+        except Exception:
+            LOGGER.exception("Error writing the dead letter of house %s", house_link)
+        # pylint: enable=broad-except
+        report.add(house_link, RunReport.DEAD_LETTER)
+
+    def process_houses(
+        self,
+        tasks: Dict[str, int],
+        scrapper: WebsiteScrapper,
+        num_threads: int,
+        deadline: float = None,
+    ) -> "RunReport":
+        """
+        Process houses from a shared priority queue, so the threads balance
+        the load and the most urgent houses are processed first
+
+        Args:
+            tasks (Dict[str, int]): Priority of the link of every house,
+                houses with the same priority are processed in order
+            scrapper (WebsiteScrapper): Scrapper of the houses
+            num_threads (int): Number of threads
+            deadline (float, optional): time.monotonic() after which the
+                houses left are deferred. Defaults to None (no deadline).
+
+        Returns:
+            RunReport: what happened to every house
+        """
+        report = RunReport()
+        task_queue: queue.PriorityQueue = queue.PriorityQueue()
+        for house_link, priority in tasks.items():
+            task_queue.put((priority, next(report.sequence), house_link, 0))
+        report.total = task_queue.qsize()
+
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            workers = [
+                executor.submit(
+                    self.house_worker, task_queue, scrapper, report, deadline
+                )
+                for _ in range(num_threads)
+            ]
+            join_tasks(task_queue, workers)
+            for _ in range(num_threads):
+                task_queue.put((PRIORITY_STOP, 0, None, 0))
+
+        for worker in workers:
+            if worker.exception() is not None:
+                LOGGER.error(
+                    "House worker of %s failed",
+                    scrapper.get_provider_name(),
+                    exc_info=worker.exception(),
+                )
+        return report
+
+    def remove_expired_houses(self, scrapper: WebsiteScrapper):
+        """
+        Mark the houses whose listing expired as unavailable, which is how the
+        houses of scrappers that do not fetch them one by one are delisted,
+        see WebsiteScrapper.get_house_expiry
+
+        Args:
+            scrapper (WebsiteScrapper): Scrapper of the houses
+        """
+        provider = scrapper.get_provider_name()
+        expired = self.db_handler.get_expired_houses(
+            provider, datetime.now(timezone.utc)
+        )
+        for house in expired:
+            house_id = self.db_handler.set_house_unavailable(
+                house["link"], provider
+            )
+            if house_id is not None and self.search_index is not None:
+                self.search_index.remove_house(provider, house_id)
+        if expired:
+            LOGGER.info("%d houses of %s expired", len(expired), provider)
+
+    def get_recheck_tasks(self, provider: str) -> Dict[str, int]:
+        """
+        Get the stored houses that are due to be checked again,
+        the ones with recent price changes first
+
+        Args:
+            provider (str): Name of the provider
+
+        Returns:
+            Dict[str, int]: Priority of the link of every house
+        """
+        tasks: Dict[str, int] = {}
+        # A limit of 0 means no limit to MongoDB
+        if self.max_rechecks <= 0:
+            return tasks
+        now = datetime.now(timezone.utc)
+        for house in self.db_handler.get_houses_to_recheck(
+            provider,
+            now - PRICE_CHANGE_RECHECK_INTERVAL,
+            self.max_rechecks,
+            changed_after=now - RECENT_PRICE_CHANGE,
+        ):
+            tasks[house["link"]] = PRIORITY_PRICE_CHANGE
+        if len(tasks) >= self.max_rechecks:
+            return tasks
+        for house in self.db_handler.get_houses_to_recheck(
+            provider, now - RECHECK_INTERVAL, self.max_rechecks - len(tasks)
+        ):
+            tasks.setdefault(house["link"], PRIORITY_RECHECK)
+        return tasks
+
+    def list_partitions(
+        self,
+        scrapper: WebsiteScrapper,
+        locations: List[str],
+        min_date: Optional[datetime],
+        partitions: Dict[str, dict],
+    ) -> Tuple[List[str], Dict[str, dict]]:
+        """
+        List the houses of every location in parallel, each one from its own
+        watermark, and merge them without the houses found more than once.
+        A location that fails does not stop the others, and is listed again
+        from its watermark only by the next run
+
+        Args:
+            scrapper (WebsiteScrapper): Scrapper of the houses
+            locations (List[str]): Locations of the scrapper
+            min_date (Optional[datetime]): Date of the latest house stored,
+                None if there is none
+            partitions (Dict[str, dict]): State of every location saved by
+                the last run
+
+        Returns:
+            Tuple[List[str], Dict[str, dict]]: Links of the houses and the
+                state of every location for the next run
+        """
+
+        def list_location(location: str) -> List[str]:
+            # The stage of the caller does not cover the threads of the pool
+            with profiler.stage(
+                scrapper.get_provider_name(), profiler.STAGE_LISTING
+            ):
+                state = partitions.get(location, {})
+                return scrapper.get_house_list(
+                    location=location,
+                    min_date=None if state.get("failed") else min_date,
+                    watermark=set(state.get("watermark", [])),
+                )
+
         LOGGER.info(
-            "Requesting %d houses from %s",
-            len(house_list),
+            "Listing %d locations of %s",
+            len(locations),
             scrapper.get_provider_name(),
         )
-        for house_link in house_list:
-            LOGGER.debug("Processing house %s", house_link)
-            try:
-                house, date = scrapper.get_house(house_link)  # type: ignore
-                house["date_modified"] = date  # type: ignore
-                house["link"] = house_link  # type: ignore
-                house["available"] = True  # type: ignore
-
-                if "_id" not in house:
-                    house["_id"] = house_link  # type: ignore
+        num_threads = max(1, min(self.partition_threads, len(locations)))
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            futures = [
+                executor.submit(list_location, location)
+                for location in locations
+            ]
 
-                self.db_handler.insert_house(house, scrapper.get_provider_name())  # type: ignore
-            except Exception as _e:
+        # pylint: disable=broad-except
+        house_list = []
+        house_ids = set()
+        new_partitions = {}
+        for location, future in zip(locations, futures):
+            state = partitions.get(location, {})
+            try:
+                links = future.result()
+            except Exception:
                 LOGGER.exception(
-                    "Error processing house %s with exception",
-                    house_link,
-                    # str(_e),
+                    "Error listing location %s of %s",
+                    location,
+                    scrapper.get_provider_name(),
                 )
+                new_partitions[location] = dict(state, failed=True)
+                continue
+
+            LOGGER.info("Found %d houses in %s", len(links), location)
+            new_partitions[location] = {
+                "watermark": merge_watermark(
+                    state.get("watermark", []), links
+                ),
+                "failed": False,
+            }
+            for link in links:
+                house_id = scrapper.get_house_id(link)
+                if house_id not in house_ids:
+                    house_ids.add(house_id)
+                    house_list.append(link)
         # pylint: enable=broad-except
 
+        return house_list, new_partitions
+
     def process_scrapper(self, scrapper: WebsiteScrapper):
         """
         Process a scrapper
@@ -109,25 +508,53 @@ class DataCollector:
             scrapper (WebsiteScrapper): Scrapper to process
         """
         LOGGER.info("Processing %s", scrapper.get_provider_name())
+        self.db_handler.ensure_indexes(scrapper.get_provider_name())
 
         latest_house = self.db_handler.get_latest_house(
             scrapper.get_provider_name()
         )
+        min_date = latest_house["date_modified"] if latest_house else None
 
-        if not latest_house:
-            LOGGER.info(
-                "No houses in database for %s", scrapper.get_provider_name()
-            )
-            house_list = scrapper.get_house_list()
-        else:
-            LOGGER.info(
-                "Latest house in database for %s from %s",
-                scrapper.get_provider_name(),
-                latest_house["date_modified"],
-            )
-            house_list = scrapper.get_house_list(
-                min_date=latest_house["date_modified"]
-            )
+        crawl_state = self.db_handler.get_crawl_state(
+            scrapper.get_provider_name()
+        )
+        watermark = crawl_state.get("watermark", [])
+        new_crawl_state: dict = {}
+
+        with profiler.stage(
+            scrapper.get_provider_name(), profiler.STAGE_LISTING
+        ):
+            scrapper.start_listing()
+            locations = scrapper.get_locations() if self.partition else []
+            if locations:
+                house_list, new_crawl_state["partitions"] = self.list_partitions(
+                    scrapper,
+                    locations,
+                    min_date,
+                    crawl_state.get("partitions", {}),
+                )
+            elif not latest_house:
+                LOGGER.info(
+                    "No houses in database for %s",
+                    scrapper.get_provider_name(),
+                )
+                house_list = scrapper.get_house_list()
+            else:
+                LOGGER.info(
+                    "Latest house in database for %s from %s, watermark of %d houses",
+                    scrapper.get_provider_name(),
+                    min_date,
+                    len(watermark),
+                )
+                house_list = scrapper.get_house_list(
+                    min_date=min_date,
+                    watermark=set(watermark),
+                )
+            if not locations:
+                # The newest houses are where the next run stops listing
+                new_crawl_state["watermark"] = merge_watermark(
+                    watermark, house_list
+                )
 
         with open("house_cache_list.txt", "w", encoding="utf-8") as file:
             for house in house_list:
@@ -136,32 +563,207 @@ class DataCollector:
         LOGGER.info("Found %d houses", len(house_list))
         LOGGER.info("Houses written to house_cache_list.txt")
 
-        if scrapper.is_get_house_request() and self.use_threading:
+        # New houses first, in listing order
+        tasks = dict.fromkeys(house_list, PRIORITY_NEW)
+
+        # Only scrappers that request every house can fetch a house that is
+        # not in their listing, so the others are never deferred nor rechecked
+        fetches_houses = scrapper.is_get_house_request()
+        if fetches_houses:
+            pending = crawl_state.get("pending", [])
+            rechecks = self.get_recheck_tasks(scrapper.get_provider_name())
+            LOGGER.info(
+                "%d houses pending from the last run, %d to check again",
+                len(pending),
+                len(rechecks),
+            )
+            for house_link, priority in list(pending) + list(rechecks.items()):
+                tasks[house_link] = min(
+                    priority, tasks.get(house_link, PRIORITY_RECHECK)
+                )
+
+        dead_letters = []
+        if self.replay_dead_letters:
+            dead_letters = self.db_handler.get_dead_letters(
+                scrapper.get_provider_name()
+            )
+            if fetches_houses:
+                for house_link in dead_letters:
+                    tasks.setdefault(house_link, PRIORITY_RECHECK)
+                LOGGER.info("Replaying %d dead letters", len(dead_letters))
+            else:
+                # The houses can only be processed from the listing, so the
+                # dead letters not listed again are dropped
+                LOGGER.info(
+                    "Replaying %d of %d dead letters found in the listing",
+                    sum(house_link in tasks for house_link in dead_letters),
+                    len(dead_letters),
+                )
+
+        if fetches_houses and self.use_threading:
             # If the scrapper does get requests per house,
             # use multiple threads to make the requests
-
             # Make sure to not spawn more threads than houses
-            if self.max_threads > len(house_list):
-                tmp_threads = len(house_list)
-            else:
-                tmp_threads = self.max_threads
+            num_threads = max(1, min(self.max_threads, len(tasks)))
+        else:
+            num_threads = 1
 
-            LOGGER.info(
-                "Processing %d Houses with %d threads",
-                len(house_list),
-                tmp_threads,
+        LOGGER.info(
+            "Processing %d Houses with %d threads", len(tasks), num_threads
+        )
+        # Only the houses that can be fetched again are deferred
+        report = self.process_houses(
+            tasks,
+            scrapper,
+            num_threads,
+            self.deadline if fetches_houses else None,
+        )
+        report.log(scrapper.get_provider_name())
+
+        # Dead letters that succeeded this time, or that were dropped,
+        # are no longer dead
+        if dead_letters:
+            self.db_handler.remove_dead_letters(
+                scrapper.get_provider_name(),
+                [
+                    link
+                    for link in dead_letters
+                    if link not in report.dead_letters
+                    and link not in report.deferred
+                ],
             )
 
-            size_chunks = math.ceil(len(house_list) / tmp_threads)
+        self.remove_expired_houses(scrapper)
 
-            with ThreadPoolExecutor(max_workers=tmp_threads) as executor:
-                chunks = [
-                    house_list[offset : offset + 100]
-                    for offset in range(0, len(house_list), size_chunks)
-                ]
-                executor.map(self.request_pool, chunks)
-        else:
-            LOGGER.info("Processing %d Houses with 1 thread", len(house_list))
-            self.request_pool(house_list, scrapper)
+        # The deferred houses are where the next run starts processing
+        new_crawl_state["pending"] = [
+            [house_link, priority]
+            for house_link, priority in report.deferred.items()
+        ]
+        self.db_handler.set_crawl_state(
+            scrapper.get_provider_name(), new_crawl_state
+        )
+
+        # Flushed last, so every write of the run is committed
+        # before the DataCollector sleeps or exits
+        self.db_handler.flush()
+        if self.search_index is not None:
+            self.search_index.save()
 
         LOGGER.info("Finished processing %s", scrapper.get_provider_name())
+
+
+def merge_watermark(watermark: List[str], links: List[str]) -> List[str]:
+    """
+    Add the links listed by a run to the watermark of the previous run,
+    so a run that finds few houses does not shrink the watermark
+
+    Args:
+        watermark (List[str]): Watermark of the previous run, oldest first
+        links (List[str]): Links listed by the run, oldest first
+
+    Returns:
+        List[str]: The newest WATERMARK_SIZE links, oldest first
+    """
+    new_links = set(links)
+    merged = [link for link in watermark if link not in new_links] + links
+    return merged[-WATERMARK_SIZE:]
+
+
+def join_tasks(task_queue: queue.Queue, workers: List[Future]):
+    """
+    Wait until every task of a queue is done, like task_queue.join(),
+    but stop waiting if every worker of the queue exited
+
+    Args:
+        task_queue (queue.Queue): Queue of the tasks
+        workers (List[Future]): Workers that process the queue
+    """
+    with task_queue.all_tasks_done:
+        while task_queue.unfinished_tasks:
+            if all(worker.done() for worker in workers):
+                LOGGER.error(
+                    "Every worker exited with %d tasks left",
+                    task_queue.unfinished_tasks,
+                )
+                return
+            task_queue.all_tasks_done.wait(timeout=JOIN_CHECK_SEC)
+
+
+class RunReport:
+    """
+    Accounts for every house of a run
+    Thread safe
+    """
+
+    WRITTEN = "written"
+    UNAVAILABLE = "unavailable"
+    RETRIED = "retried"
+    DEAD_LETTER = "dead_letter"
+    DEFERRED = "deferred"
+
+    def __init__(self):
+        self.total = 0
+        self.counts = {
+            self.WRITTEN: 0,
+            self.UNAVAILABLE: 0,
+            self.RETRIED: 0,
+            self.DEAD_LETTER: 0,
+            self.DEFERRED: 0,
+        }
+        self.dead_letters: Set[str] = set()
+        # Priority of the houses left for the next run
+        self.deferred: Dict[str, int] = {}
+        # Orders the tasks of the same priority
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+
+    def add(self, house_link: str, outcome: str):
+        """
+        Record the outcome of an attempt to process a house
+        """
+        with self.lock:
+            self.counts[outcome] += 1
+            if outcome == self.DEAD_LETTER:
+                self.dead_letters.add(house_link)
+
+    def defer(self, house_link: str, priority: int):
+        """
+        Leave a house for the next run
+        """
+        with self.lock:
+            self.counts[self.DEFERRED] += 1
+            self.deferred[house_link] = priority
+
+    def finished(self) -> int:
+        """
+        Number of houses that reached a final outcome
+        """
+        return (
+            self.counts[self.WRITTEN]
+            + self.counts[self.UNAVAILABLE]
+            + self.counts[self.DEAD_LETTER]
+            + self.counts[self.DEFERRED]
+        )
+
+    def log(self, provider: str):
+        """
+        Log the report and check that no house was lost
+        """
+        LOGGER.info(
+            "Run of %s: %d houses, %d written, %d unavailable, "
+            "%d retries, %d dead letters, %d deferred",
+            provider,
+            self.total,
+            self.counts[self.WRITTEN],
+            self.counts[self.UNAVAILABLE],
+            self.counts[self.RETRIED],
+            self.counts[self.DEAD_LETTER],
+            self.counts[self.DEFERRED],
+        )
+        if self.finished() != self.total:
+            LOGGER.error(
+                "%d houses of %s are unaccounted for",
+                self.total - self.finished(),
+                provider,
+            )
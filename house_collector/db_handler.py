@@ -3,16 +3,36 @@ Module the interfaces with the MongoDB
 """
 
 import logging
-from typing import List
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
 
 import pymongo
 
+from house_collector.events import EventSink, delisted_event, house_events
+from house_collector.geo import EARTH_RADIUS_M, GEO_FIELD, comparables_filter
+from house_collector.normalization import (
+    BEDROOMS_FIELD,
+    CONDITION_FIELD,
+    PRICE_CENTS_FIELD,
+)
+from house_collector.storage import (
+    EXPIRES_AT_FIELD,
+    LAST_CHECKED_FIELD,
+    PRICE_CHANGED_AT_FIELD,
+    StorageBackend,
+    track_price_change,
+)
+
 LOGGER = logging.getLogger("DBHandler")
 DB_NAME = "houses"
+CRAWL_STATE_COLLECTION = "crawl_state"
+DEAD_LETTER_COLLECTION = "dead_letters"
 
 
-class DBHandler:
-    """_summary_"""
+class DBHandler(StorageBackend):
+    """
+    MongoDB storage, every provider has its own collection
+    """
 
     def __init__(
         self, host: str, port: int, db_name: str = DB_NAME
@@ -23,6 +43,8 @@ class DBHandler:
         self.db_name = db_name
         self.client = pymongo.MongoClient(host, port)
         self.db_client = self.client[db_name]
+        # Receives the events of the houses written, see events.py
+        self.event_sink: Optional[EventSink] = None
         LOGGER.debug("Connected to database %s", db_name)
 
     def insert_house(self, data: dict, collection_name: str):
@@ -40,6 +62,7 @@ class DBHandler:
         # Check if already exists in db
         old_record = collection.find_one({"_id": data["_id"]})
         if old_record:
+            track_price_change(old_record, data)
 
             # If the new record is different from the old one, update it
             if data != old_record:
@@ -68,6 +91,97 @@ class DBHandler:
                 collection_name,
             )
 
+        # Only emitted once the write succeeded
+        if self.event_sink is not None:
+            for event in house_events(collection_name, old_record, data):
+                self.event_sink.emit(event)
+
+    def set_house_unavailable(self, link: str, collection_name: str):
+        """
+        Mark a house as no longer available
+
+        Args:
+            link (str): link of the house
+            collection_name (str): name of the collection of the house
+
+        Returns:
+            the id of the house, None if it was not available in the database
+        """
+        collection = self.db_client[collection_name]
+        old_record = collection.find_one_and_update(
+            {"link": link, "available": True},
+            {"$set": {"available": False}},
+            projection={"_id": 1},
+        )
+        if old_record is None:
+            return None
+
+        LOGGER.debug(
+            "House %s is no longer available in %s",
+            old_record["_id"],
+            collection_name,
+        )
+        if self.event_sink is not None:
+            self.event_sink.emit(
+                delisted_event(collection_name, old_record["_id"])
+            )
+        return old_record["_id"]
+
+    def insert_dead_letter(
+        self, link: str, collection_name: str, error: str, attempts: int
+    ):
+        """
+        Park a house that could not be processed, so it can be replayed later
+
+        Args:
+            link (str): link of the house
+            collection_name (str): name of the collection of the house
+            error (str): last error raised while processing the house
+            attempts (int): number of attempts made
+        """
+        self.db_client[DEAD_LETTER_COLLECTION].update_one(
+            {"provider": collection_name, "link": link},
+            {
+                "$set": {
+                    "error": error,
+                    "date": datetime.now(timezone.utc),
+                },
+                "$inc": {"attempts": attempts},
+            },
+            upsert=True,
+        )
+        LOGGER.debug("House %s sent to the dead letters", link)
+
+    def get_dead_letters(self, collection_name: str) -> List[str]:
+        """
+        Get the links of the dead letters of a provider
+
+        Args:
+            collection_name (str): name of the collection of the provider
+
+        Returns:
+            List[str]: the links of the houses
+        """
+        return [
+            dead_letter["link"]
+            for dead_letter in self.db_client[DEAD_LETTER_COLLECTION].find(
+                {"provider": collection_name}, {"link": 1}
+            )
+        ]
+
+    def remove_dead_letters(self, collection_name: str, links: List[str]):
+        """
+        Remove dead letters that were processed successfully
+
+        Args:
+            collection_name (str): name of the collection of the provider
+            links (List[str]): links of the houses
+        """
+        if links:
+            self.db_client[DEAD_LETTER_COLLECTION].delete_many(
+                {"provider": collection_name, "link": {"$in": links}}
+            )
+
     def insert_houses(self, data: List[dict], collection_name: str):
         """
         Insert a house in the database
@@ -79,6 +193,230 @@ class DBHandler:
 
         raise NotImplementedError()
 
+    def ensure_indexes(self, collection_name: str):
+        """
+        Create the indexes used by the queries of this handler.
+        Creating an index that already exists is a no-op in MongoDB
+
+        Args:
+            collection_name (str): name of the collection
+        """
+        collection = self.db_client[collection_name]
+        collection.create_index([(GEO_FIELD, pymongo.GEOSPHERE)])
+        collection.create_index("link")
+
+        # Equality fields first and the price range last, so the filtered
+        # queries over the canonical fields are index scans
+        collection.create_index(
+            [("available", 1), (BEDROOMS_FIELD, 1), (PRICE_CENTS_FIELD, 1)]
+        )
+        collection.create_index(
+            [("available", 1), (CONDITION_FIELD, 1), (PRICE_CENTS_FIELD, 1)]
+        )
+        collection.create_index([("available", 1), (PRICE_CENTS_FIELD, 1)])
+
+        # Houses to check again, see get_houses_to_recheck
+        collection.create_index([("available", 1), (LAST_CHECKED_FIELD, 1)])
+        collection.create_index(
+            [("available", 1), (PRICE_CHANGED_AT_FIELD, 1)]
+        )
+        # Expired listings, see get_expired_houses
+        collection.create_index([("available", 1), (EXPIRES_AT_FIELD, 1)])
+        LOGGER.debug("Indexes ensured for collection %s", collection_name)
+
+    def get_houses_to_recheck(
+        self,
+        collection_name: str,
+        checked_before: datetime,
+        limit: int,
+        changed_after: datetime = None,
+    ) -> List[dict]:
+        """
+        Get the available houses not checked since a date,
+        least recently checked first
+
+        Args:
+            collection_name (str): name of the collection
+            checked_before (datetime): houses checked after it are skipped
+            limit (int): maximum number of houses
+            changed_after (datetime, optional): only the houses whose price
+                changed after it. Defaults to None.
+
+        Returns:
+            List[dict]: the link and the dates of the houses
+        """
+        query: dict = {
+            "available": True,
+            # None also matches the houses that were never checked
+            "$or": [
+                {LAST_CHECKED_FIELD: {"$lt": checked_before}},
+                {LAST_CHECKED_FIELD: None},
+            ],
+        }
+        if changed_after is not None:
+            query[PRICE_CHANGED_AT_FIELD] = {"$gte": changed_after}
+
+        return list(
+            self.db_client[collection_name]
+            .find(
+                query,
+                {"link": 1, LAST_CHECKED_FIELD: 1, PRICE_CHANGED_AT_FIELD: 1},
+            )
+            .sort(LAST_CHECKED_FIELD, pymongo.ASCENDING)
+            .limit(limit)
+        )
+
+    def get_expired_houses(
+        self, collection_name: str, now: datetime
+    ) -> List[dict]:
+        """
+        Get the available houses whose listing expired before now
+
+        Args:
+            collection_name (str): name of the collection
+            now (datetime): current date
+
+        Returns:
+            List[dict]: the link of the houses
+        """
+        return list(
+            self.db_client[collection_name].find(
+                {"available": True, EXPIRES_AT_FIELD: {"$lt": now}},
+                {"link": 1},
+            )
+        )
+
+    def get_houses(
+        self,
+        collection_name: str,
+        typology: int = None,
+        min_price: float = None,
+        max_price: float = None,
+        condition: str = None,
+        limit: int = None,
+    ) -> List[dict]:
+        """
+        Get the available houses that match the canonical fields,
+        cheapest first
+
+        Args:
+            collection_name (str): name of the collection
+            typology (int, optional): number of bedrooms. Defaults to None.
+            min_price (float, optional): minimum price. Defaults to None.
+            max_price (float, optional): maximum price. Defaults to None.
+            condition (str, optional): one of normalization.CONDITIONS.
+                Defaults to None.
+            limit (int, optional): maximum number of houses. Defaults to None.
+
+        Returns:
+            List[dict]: the houses found
+        """
+        cursor = (
+            self.db_client[collection_name]
+            .find(comparables_filter(typology, min_price, max_price, condition))
+            .sort(PRICE_CENTS_FIELD, pymongo.ASCENDING)
+        )
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def get_houses_in_radius(
+        self,
+        collection_name: str,
+        latitude: float,
+        longitude: float,
+        radius_m: float,
+        typology: int = None,
+        min_price: float = None,
+        max_price: float = None,
+    ) -> List[dict]:
+        """
+        Get every available house within a radius of a location
+
+        Args:
+            collection_name (str): name of the collection
+            latitude (float): latitude of the location
+            longitude (float): longitude of the location
+            radius_m (float): radius in meters
+            typology (int, optional): number of bedrooms. Defaults to None.
+            min_price (float, optional): minimum price. Defaults to None.
+            max_price (float, optional): maximum price. Defaults to None.
+
+        Returns:
+            List[dict]: the houses found
+        """
+        query = comparables_filter(typology, min_price, max_price)
+        query[GEO_FIELD] = {
+            "$geoWithin": {
+                "$centerSphere": [
+                    [longitude, latitude],
+                    radius_m / EARTH_RADIUS_M,
+                ]
+            }
+        }
+        return list(self.db_client[collection_name].find(query))
+
+    def get_nearest_houses(
+        self,
+        collection_name: str,
+        latitude: float,
+        longitude: float,
+        k: int = 10,
+        typology: int = None,
+        min_price: float = None,
+        max_price: float = None,
+        max_distance_m: float = None,
+    ) -> List[dict]:
+        """
+        Get the k nearest available houses (comparables) to a location.
+        The houses are returned nearest first with the distance in meters
+        in the "distance" field
+
+        Args:
+            collection_name (str): name of the collection
+            latitude (float): latitude of the location
+            longitude (float): longitude of the location
+            k (int, optional): number of houses to return. Defaults to 10.
+            typology (int, optional): number of bedrooms. Defaults to None.
+            min_price (float, optional): minimum price. Defaults to None.
+            max_price (float, optional): maximum price. Defaults to None.
+            max_distance_m (float, optional): maximum distance in meters.
+                Defaults to None.
+
+        Returns:
+            List[dict]: the comparable houses
+        """
+        geo_near = {
+            "near": {"type": "Point", "coordinates": [longitude, latitude]},
+            "distanceField": "distance",
+            "key": GEO_FIELD,
+            "spherical": True,
+            "query": comparables_filter(typology, min_price, max_price),
+        }
+        if max_distance_m is not None:
+            geo_near["maxDistance"] = max_distance_m
+
+        pipeline = [{"$geoNear": geo_near}, {"$limit": k}]
+        return list(self.db_client[collection_name].aggregate(pipeline))
+
+    def get_houses_with_location(
+        self, collection_name: str, projection: dict = None
+    ) -> Iterator[dict]:
+        """
+        Iterate over every available house with coordinates,
+        used to build an in memory geo.KDTree for batch jobs
+
+        Args:
+            collection_name (str): name of the collection
+            projection (dict, optional): fields to return. Defaults to None.
+
+        Returns:
+            Iterator[dict]: the houses
+        """
+        return self.db_client[collection_name].find(
+            {GEO_FIELD: {"$type": "object"}, "available": True}, projection
+        )
+
     def get_latest_house(self, collection_name: str):
         """
         Get the latest house inserted in the database
@@ -92,10 +430,39 @@ class DBHandler:
 
         LOGGER.debug("Getting latest house from collection %s", collection_name)
         collection = self.db_client[collection_name]
-        return collection.find_one(sort=[("data_scrapped", -1)])
+        return collection.find_one(sort=[("date_modified", -1)])
+
+    def get_crawl_state(self, collection_name: str) -> dict:
+        """
+        Get the state saved by the last run of a provider, such as the watermark
+
+        Args:
+            collection_name (str): name of the collection of the provider
+
+        Returns:
+            dict: the state, empty if there was no previous run
+        """
+        state = self.db_client[CRAWL_STATE_COLLECTION].find_one(
+            {"_id": collection_name}
+        )
+        return state or {}
+
+    def set_crawl_state(self, collection_name: str, state: dict):
+        """
+        Save the state of the run of a provider
+
+        Args:
+            collection_name (str): name of the collection of the provider
+            state (dict): the state to save
+        """
+        self.db_client[CRAWL_STATE_COLLECTION].update_one(
+            {"_id": collection_name}, {"$set": state}, upsert=True
+        )
 
     def close(self):
         """
         Close the connection to the database
         """
+        if self.event_sink is not None:
+            self.event_sink.close()
         self.client.close()
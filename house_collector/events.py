@@ -0,0 +1,479 @@
+"""
+Module with the events emitted by the ingest path when a house changes.
+
+The DBHandler decides which events a write produces (new listing, price change,
+delisted, reactivated) and sends them to an EventSink, which can be an append
+only JSONL file, a local unix socket or a MongoDB capped collection.
+Every sink can be tailed from an offset, so subscribers can resume where
+they stopped.
+
+Delisted events come from houses found unavailable when fetched or, for the
+providers whose houses are never fetched one by one (OLX), whose listing expired.
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from house_collector.normalization import PRICE_CENTS_FIELD
+
+LOGGER = logging.getLogger("Events")
+
+EVENT_NEW_LISTING = "new_listing"
+EVENT_PRICE_CHANGE = "price_change"
+EVENT_DELISTED = "delisted"
+EVENT_REACTIVATED = "reactivated"
+
+# The canonical price, so a change in how a provider formats it
+# is not reported as a price change
+PRICE_FIELD = PRICE_CENTS_FIELD
+POLL_INTERVAL = 0.1
+SOCKET_BUFFER_SIZE = 100000
+CAPPED_COLLECTION = "events"
+CAPPED_COLLECTION_SIZE = 256 * 1024 * 1024
+
+
+def make_event(
+    event_type: str,
+    provider: str,
+    house_id,
+    old: dict = None,
+    new: dict = None,
+) -> dict:
+    """
+    Build an event
+
+    Args:
+        event_type (str): one of the EVENT_* constants
+        provider (str): name of the provider
+        house_id: id of the house
+        old (dict, optional): old values of the changed fields. Defaults to None.
+        new (dict, optional): new values of the changed fields. Defaults to None.
+
+    Returns:
+        dict: the event
+    """
+    return {
+        "type": event_type,
+        "provider": provider,
+        "house_id": house_id,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "old": old or {},
+        "new": new or {},
+    }
+
+
+def house_events(
+    provider: str, old_record: Optional[dict], new_record: dict
+) -> List[dict]:
+    """
+    Get the events produced by writing a house over its previous version
+
+    Args:
+        provider (str): name of the provider
+        old_record (Optional[dict]): house in the database, None if it is new
+        new_record (dict): house being written
+
+    Returns:
+        List[dict]: the events, empty if nothing relevant changed
+    """
+    house_id = new_record["_id"]
+    if old_record is None:
+        return [
+            make_event(
+                EVENT_NEW_LISTING,
+                provider,
+                house_id,
+                new={
+                    key: new_record.get(key)
+                    for key in (PRICE_FIELD, "title", "link")
+                },
+            )
+        ]
+
+    events = []
+    if new_record.get("available", True) and not old_record.get(
+        "available", True
+    ):
+        events.append(
+            make_event(
+                EVENT_REACTIVATED,
+                provider,
+                house_id,
+                old={"available": False},
+                new={"available": True},
+            )
+        )
+
+    old_price = old_record.get(PRICE_FIELD)
+    new_price = new_record.get(PRICE_FIELD)
+    if PRICE_FIELD in new_record and PRICE_FIELD in old_record and (
+        old_price != new_price
+    ):
+        events.append(
+            make_event(
+                EVENT_PRICE_CHANGE,
+                provider,
+                house_id,
+                old={PRICE_FIELD: old_price},
+                new={PRICE_FIELD: new_price},
+            )
+        )
+
+    return events
+
+
+def delisted_event(provider: str, house_id) -> dict:
+    """
+    Get the event of a house that is no longer available
+    """
+    return make_event(
+        EVENT_DELISTED,
+        provider,
+        house_id,
+        old={"available": True},
+        new={"available": False},
+    )
+
+
+def _dumps(event: dict) -> str:
+    return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class EventSink:
+    """
+    Destination of the events, implementations must be thread safe
+    """
+
+    def emit(self, event: dict):
+        """
+        Send an event to the sink
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        """
+        Release the resources of the sink
+        """
+
+
+class JsonlEventSink(EventSink):
+    """
+    Appends the events to a JSONL file, the offset of an event
+    is the byte offset of its line
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        # pylint: disable=consider-using-with
+        self.file = open(path, "a", encoding="utf-8")
+        # pylint: enable=consider-using-with
+
+    def emit(self, event: dict):
+        line = _dumps(event) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def tail_jsonl(
+    path: str, offset: int = 0, follow: bool = True
+) -> Iterator[Tuple[int, dict]]:
+    """
+    Read the events of a JSONL sink
+
+    Args:
+        path (str): path of the JSONL file
+        offset (int, optional): byte offset to start from. Defaults to 0.
+        follow (bool, optional): wait for new events at the end of the file.
+            Defaults to True.
+
+    Yields:
+        Tuple[int, dict]: the offset to resume after the event, and the event
+    """
+    while not os.path.exists(path):
+        if not follow:
+            return
+        time.sleep(POLL_INTERVAL)
+
+    with open(path, "rb") as file:
+        file.seek(offset)
+        pending = b""
+        while True:
+            line = file.readline()
+            if not line:
+                if not follow:
+                    return
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            pending += line
+            if not pending.endswith(b"\n"):
+                # Partial line, the writer has not finished it yet
+                continue
+
+            offset += len(pending)
+            event = json.loads(pending)
+            pending = b""
+            yield offset, event
+
+
+class SocketEventSink(EventSink):
+    """
+    Broadcasts the events to the clients of a unix socket.
+    The offset of an event is its sequence number, the last events are kept
+    in memory so clients can resume after reconnecting
+    """
+
+    def __init__(self, address: str, buffer_size: int = SOCKET_BUFFER_SIZE):
+        """
+        Constructor
+
+        Args:
+            address (str): path of the unix socket
+            buffer_size (int, optional): number of events kept for clients
+                that resume. Defaults to SOCKET_BUFFER_SIZE.
+        """
+        self.address = address
+        self.lock = threading.Lock()
+        self.buffer: deque = deque(maxlen=buffer_size)
+        self.next_offset = 0
+        self.clients: List[socket.socket] = []
+
+        if os.path.exists(address):
+            os.unlink(address)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(address)
+        self.server.listen()
+        self.accept_thread = threading.Thread(
+            target=self._accept_loop, name="SocketEventSink", daemon=True
+        )
+        self.accept_thread.start()
+        LOGGER.info("Event socket listening on %s", address)
+
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            # A stalled client must not block the ingest path
+            client.settimeout(1)
+
+            # Clients start by sending the offset to resume from
+            try:
+                with client.makefile("r", encoding="utf-8") as reader:
+                    offset = int(reader.readline().strip() or -1)
+            except (OSError, ValueError):
+                client.close()
+                continue
+
+            with self.lock:
+                try:
+                    if offset >= 0:
+                        for event_offset, line in self.buffer:
+                            if event_offset >= offset:
+                                client.sendall(line)
+                    self.clients.append(client)
+                except OSError:
+                    client.close()
+
+    def emit(self, event: dict):
+        with self.lock:
+            offset = self.next_offset
+            self.next_offset += 1
+            event = dict(event, offset=offset)
+            line = (_dumps(event) + "\n").encode("utf-8")
+            self.buffer.append((offset, line))
+
+            for client in list(self.clients):
+                try:
+                    client.sendall(line)
+                except OSError:
+                    self.clients.remove(client)
+                    client.close()
+
+    def close(self):
+        self.server.close()
+        with self.lock:
+            for client in self.clients:
+                client.close()
+            self.clients = []
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+def tail_socket(address: str, offset: int = -1) -> Iterator[Tuple[int, dict]]:
+    """
+    Read the events of a socket sink
+
+    Args:
+        address (str): path of the unix socket
+        offset (int, optional): sequence number to resume from,
+            -1 to only receive new events. Defaults to -1.
+
+    Yields:
+        Tuple[int, dict]: the offset to resume after the event, and the event
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(address)
+        client.sendall(f"{offset}\n".encode("utf-8"))
+        with client.makefile("r", encoding="utf-8") as reader:
+            for line in reader:
+                event = json.loads(line)
+                yield event["offset"] + 1, event
+
+
+class MongoEventSink(EventSink):
+    """
+    Inserts the events in a MongoDB capped collection,
+    the offset of an event is its sequence number
+    """
+
+    def __init__(
+        self,
+        db_client,
+        collection_name: str = CAPPED_COLLECTION,
+        size: int = CAPPED_COLLECTION_SIZE,
+    ):
+        """
+        Constructor
+
+        Args:
+            db_client: pymongo database
+            collection_name (str, optional): name of the capped collection.
+                Defaults to CAPPED_COLLECTION.
+            size (int, optional): size in bytes of the capped collection.
+                Defaults to CAPPED_COLLECTION_SIZE.
+        """
+        if collection_name not in db_client.list_collection_names():
+            db_client.create_collection(
+                collection_name, capped=True, size=size
+            )
+        self.collection = db_client[collection_name]
+        self.lock = threading.Lock()
+
+        last = self.collection.find_one(sort=[("$natural", -1)])
+        self.next_offset = last["offset"] + 1 if last else 0
+
+    def emit(self, event: dict):
+        with self.lock:
+            event = dict(event, offset=self.next_offset)
+            self.next_offset += 1
+            self.collection.insert_one(event)
+
+
+def tail_mongo(
+    db_client, offset: int = 0, collection_name: str = CAPPED_COLLECTION
+) -> Iterator[Tuple[int, dict]]:
+    """
+    Read the events of a MongoDB sink
+
+    Args:
+        db_client: pymongo database
+        offset (int, optional): sequence number to resume from. Defaults to 0.
+        collection_name (str, optional): name of the capped collection.
+            Defaults to CAPPED_COLLECTION.
+
+    Yields:
+        Tuple[int, dict]: the offset to resume after the event, and the event
+    """
+    # pylint: disable=import-outside-toplevel
+    import pymongo
+
+    # pylint: enable=import-outside-toplevel
+
+    collection = db_client[collection_name]
+    while True:
+        cursor = collection.find(
+            {"offset": {"$gte": offset}},
+            {"_id": 0},
+            cursor_type=pymongo.CursorType.TAILABLE_AWAIT,
+            max_await_time_ms=int(POLL_INTERVAL * 1000),
+        )
+        while cursor.alive:
+            for event in cursor:
+                offset = event["offset"] + 1
+                yield offset, event
+        # The cursor dies when the collection is empty
+        time.sleep(POLL_INTERVAL)
+
+
+def create_event_sink(spec: str, db_client=None) -> EventSink:
+    """
+    Create a sink from a specification
+
+    Args:
+        spec (str): "jsonl:<path>", "socket:<path>" or "mongo[:<collection>]"
+        db_client: pymongo database, required by the mongo sink.
+            Defaults to None.
+
+    Raises:
+        ValueError: if the specification is invalid
+
+    Returns:
+        EventSink: the sink
+    """
+    kind, _, target = spec.partition(":")
+    if kind == "jsonl" and target:
+        return JsonlEventSink(target)
+    if kind == "socket" and target:
+        return SocketEventSink(target)
+    if kind == "mongo" and db_client is not None:
+        return MongoEventSink(db_client, target or CAPPED_COLLECTION)
+    raise ValueError(f"Invalid event sink {spec}")
+
+
+def main():
+    """
+    Print the events of a sink as they arrive
+    """
+    parser = argparse.ArgumentParser(description="Tail the house events")
+    parser.add_argument(
+        "sink",
+        type=str,
+        help='"jsonl:<path>", "socket:<path>" or "mongo[:<collection>]"',
+    )
+    parser.add_argument(
+        "--offset", default=None, type=int, help="Offset to resume from"
+    )
+    parser.add_argument("--host", default="localhost", type=str)
+    parser.add_argument("--port", default=27017, type=int)
+    parsed_args = parser.parse_args()
+
+    kind, _, target = parsed_args.sink.partition(":")
+    offset = parsed_args.offset
+    if kind == "jsonl":
+        events = tail_jsonl(target, offset or 0)
+    elif kind == "socket":
+        events = tail_socket(target, -1 if offset is None else offset)
+    elif kind == "mongo":
+        # pylint: disable=import-outside-toplevel
+        from house_collector.db_handler import DBHandler
+
+        # pylint: enable=import-outside-toplevel
+        db_handler = DBHandler(parsed_args.host, parsed_args.port)
+        events = tail_mongo(
+            db_handler.db_client, offset or 0, target or CAPPED_COLLECTION
+        )
+    else:
+        parser.error(f"Invalid event sink {parsed_args.sink}")
+
+    for event_offset, event in events:
+        print(event_offset, _dumps(event), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Module with the geospatial helpers used to store house coordinates
+and to look up comparable houses around a location
+"""
+
+import heapq
+import math
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from house_collector.normalization import (
+    BEDROOMS_FIELD,
+    CONDITION_FIELD,
+    PRICE_CENTS_FIELD,
+    price_to_cents,
+)
+
+EARTH_RADIUS_M = 6371008.8
+GEO_FIELD = "geo_location"
+
+
+def make_point(latitude, longitude) -> Optional[dict]:
+    """
+    Build a GeoJSON point from a latitude and a longitude
+
+    Args:
+        latitude: latitude in degrees
+        longitude: longitude in degrees
+
+    Returns:
+        dict: a GeoJSON point, or None if the coordinates are invalid
+    """
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (TypeError, ValueError):
+        return None
+
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+
+    # GeoJSON stores the coordinates as [longitude, latitude]
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def get_point_coordinates(house: dict) -> Optional[Tuple[float, float]]:
+    """
+    Get the (latitude, longitude) of a house from its GeoJSON point
+
+    Args:
+        house (dict): house as stored in the database
+
+    Returns:
+        Tuple[float, float]: the coordinates of the house or None
+    """
+    point = house.get(GEO_FIELD)
+    if not point:
+        return None
+    longitude, latitude = point["coordinates"]
+    return latitude, longitude
+
+
+def comparables_filter(
+    typology: int = None,
+    min_price: float = None,
+    max_price: float = None,
+    condition: str = None,
+) -> dict:
+    """
+    Build the MongoDB filter used to select comparable houses,
+    over the canonical fields written by the normalization
+
+    Args:
+        typology (int, optional): number of bedrooms. Defaults to None.
+        min_price (float, optional): minimum price. Defaults to None.
+        max_price (float, optional): maximum price. Defaults to None.
+        condition (str, optional): one of normalization.CONDITIONS.
+            Defaults to None.
+
+    Returns:
+        dict: a MongoDB filter
+    """
+    query: dict = {"available": True}
+    if typology is not None:
+        query[BEDROOMS_FIELD] = typology
+    if condition is not None:
+        query[CONDITION_FIELD] = condition
+
+    price: dict = {}
+    if min_price is not None:
+        price["$gte"] = price_to_cents(min_price)
+    if max_price is not None:
+        price["$lte"] = price_to_cents(max_price)
+    if price:
+        query[PRICE_CENTS_FIELD] = price
+
+    return query
+
+
+def comparables_predicate(
+    typology: int = None,
+    min_price: float = None,
+    max_price: float = None,
+    condition: str = None,
+) -> Callable[[dict], bool]:
+    """
+    Same as comparables_filter but evaluated in memory over house dicts
+    """
+    min_cents = price_to_cents(min_price)
+    max_cents = price_to_cents(max_price)
+
+    def predicate(house: dict) -> bool:
+        if not house.get("available", True):
+            return False
+        if typology is not None and house.get(BEDROOMS_FIELD) != typology:
+            return False
+        if condition is not None and house.get(CONDITION_FIELD) != condition:
+            return False
+        if min_cents is not None or max_cents is not None:
+            price = house.get(PRICE_CENTS_FIELD)
+            if price is None:
+                return False
+            if min_cents is not None and price < min_cents:
+                return False
+            if max_cents is not None and price > max_cents:
+                return False
+        return True
+
+    return predicate
+
+
+def haversine_distance(
+    lat1: float, lon1: float, lat2: float, lon2: float
+) -> float:
+    """
+    Great circle distance, in meters, between two coordinates
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    hav = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(hav)))
+
+
+def _to_cartesian(latitude: float, longitude: float) -> Tuple[float, ...]:
+    phi = math.radians(latitude)
+    lam = math.radians(longitude)
+    return (
+        math.cos(phi) * math.cos(lam),
+        math.cos(phi) * math.sin(lam),
+        math.sin(phi),
+    )
+
+
+def _chord_to_meters(chord: float) -> float:
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, chord / 2))
+
+
+def _meters_to_chord(meters: float) -> float:
+    if meters >= math.pi * EARTH_RADIUS_M:
+        return 2.0
+    return 2 * math.sin(meters / (2 * EARTH_RADIUS_M))
+
+
+class KDTree:
+    """
+    In memory KD-tree over house coordinates used by batch comparables jobs.
+
+    Points are projected onto the unit sphere so the euclidean (chord)
+    distance is monotonic with the great circle distance, which keeps the
+    tree correct near the poles and the antimeridian.
+    """
+
+    def __init__(self, houses: Iterable[dict]):
+        """
+        Constructor
+
+        Args:
+            houses (Iterable[dict]): houses with a GeoJSON point,
+                houses without coordinates are ignored
+        """
+        self.houses: List[dict] = []
+        points = []
+        for house in houses:
+            coordinates = get_point_coordinates(house)
+            if coordinates is None:
+                continue
+            points.append(_to_cartesian(*coordinates))
+            self.houses.append(house)
+
+        self.points = points
+        # Flat tree: every node is (index, axis, left, right)
+        self.nodes: List[Tuple[int, int, int, int]] = []
+        self.root = self._build(list(range(len(points))), 0)
+
+    def __len__(self):
+        return len(self.houses)
+
+    def _build(self, indexes: List[int], depth: int) -> int:
+        if not indexes:
+            return -1
+        axis = depth % 3
+        indexes.sort(key=lambda i: self.points[i][axis])
+        median = len(indexes) // 2
+        node_id = len(self.nodes)
+        self.nodes.append((indexes[median], axis, -1, -1))
+        left = self._build(indexes[:median], depth + 1)
+        right = self._build(indexes[median + 1 :], depth + 1)
+        self.nodes[node_id] = (indexes[median], axis, left, right)
+        return node_id
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int = 10,
+        predicate: Callable[[dict], bool] = None,
+        max_distance_m: float = None,
+    ) -> List[Tuple[float, dict]]:
+        """
+        Get the k nearest houses to a location
+
+        Args:
+            latitude (float): latitude of the location
+            longitude (float): longitude of the location
+            k (int, optional): number of houses to return. Defaults to 10.
+            predicate (Callable[[dict], bool], optional): filter applied to
+                the candidates. Defaults to None.
+            max_distance_m (float, optional): maximum distance in meters.
+                Defaults to None.
+
+        Returns:
+            List[Tuple[float, dict]]: (distance in meters, house), nearest first
+        """
+        if k <= 0 or self.root == -1:
+            return []
+
+        target = _to_cartesian(latitude, longitude)
+        max_sq = (
+            _meters_to_chord(max_distance_m) ** 2
+            if max_distance_m is not None
+            else math.inf
+        )
+        # Max heap of (-squared distance, index)
+        best: List[Tuple[float, int]] = []
+        stack = [self.root]
+
+        while stack:
+            node_id = stack.pop()
+            if node_id == -1:
+                continue
+            index, axis, left, right = self.nodes[node_id]
+            point = self.points[index]
+            dist_sq = sum((a - b) ** 2 for a, b in zip(point, target))
+
+            if dist_sq <= max_sq and (
+                predicate is None or predicate(self.houses[index])
+            ):
+                if len(best) < k:
+                    heapq.heappush(best, (-dist_sq, index))
+                elif dist_sq < -best[0][0]:
+                    heapq.heapreplace(best, (-dist_sq, index))
+
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            bound = max_sq if len(best) < k else min(max_sq, -best[0][0])
+            # Visit the far side after the near one (stack is LIFO)
+            if diff * diff <= bound:
+                stack.append(far)
+            stack.append(near)
+
+        return [
+            (_chord_to_meters(math.sqrt(-neg_sq)), self.houses[index])
+            for neg_sq, index in sorted(best, reverse=True)
+        ]
+
+    def within_radius(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_m: float,
+        predicate: Callable[[dict], bool] = None,
+    ) -> List[Tuple[float, dict]]:
+        """
+        Get every house within a radius of a location
+
+        Args:
+            latitude (float): latitude of the location
+            longitude (float): longitude of the location
+            radius_m (float): radius in meters
+            predicate (Callable[[dict], bool], optional): filter applied to
+                the candidates. Defaults to None.
+
+        Returns:
+            List[Tuple[float, dict]]: (distance in meters, house), nearest first
+        """
+        target = _to_cartesian(latitude, longitude)
+        max_sq = _meters_to_chord(radius_m) ** 2
+        found = []
+        stack = [self.root]
+
+        while stack:
+            node_id = stack.pop()
+            if node_id == -1:
+                continue
+            index, axis, left, right = self.nodes[node_id]
+            point = self.points[index]
+            dist_sq = sum((a - b) ** 2 for a, b in zip(point, target))
+            if dist_sq <= max_sq and (
+                predicate is None or predicate(self.houses[index])
+            ):
+                found.append((dist_sq, index))
+
+            diff = target[axis] - point[axis]
+            if diff <= 0 or diff * diff <= max_sq:
+                stack.append(left)
+            if diff >= 0 or diff * diff <= max_sq:
+                stack.append(right)
+
+        found.sort()
+        return [
+            (_chord_to_meters(math.sqrt(dist_sq)), self.houses[index])
+            for dist_sq, index in found
+        ]
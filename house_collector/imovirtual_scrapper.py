@@ -3,24 +3,63 @@
 
 import json
 import logging
-from datetime import datetime
-from typing import List, Tuple
+import re
+from datetime import datetime, timezone
+from typing import List, Set, Tuple
+from urllib.parse import urlparse
 
 import requests
 from bs4 import BeautifulSoup
 
-from house_collector.base_scrapper import WebsiteScrapper
-from house_collector.utils import get_until_success
+from house_collector.base_scrapper import (
+    HouseUnavailableError,
+    IncrementalListing,
+    WebsiteScrapper,
+)
+from house_collector.geo import GEO_FIELD, make_point
+from house_collector.utils import get_until_success, to_utc
 
 # pylint: disable=line-too-long
 
 LOGGER = logging.getLogger("ImovirtualScrapper")
 RESULT_PER_PAGE = 72
-URL = f"https://www.imovirtual.com/en/comprar/?nrAdsPerPage={RESULT_PER_PAGE}&page=1"
-URL_SEARCH = f"https://www.imovirtual.com/en/comprar/?search%5Bcreated_since%5D=<DAYS_ELAPSED>&nrAdsPerPage={RESULT_PER_PAGE}&page=1"
+BASE_URL = "https://www.imovirtual.com"
+SEARCH_PATH = "/en/comprar/"
+URL = f"{SEARCH_PATH}?nrAdsPerPage={RESULT_PER_PAGE}&page=1"
+URL_SEARCH = f"{SEARCH_PATH}?search%5Bcreated_since%5D=<DAYS_ELAPSED>&nrAdsPerPage={RESULT_PER_PAGE}&page=1"
+ORDER_NEWEST_FIRST = "&search%5Border%5D=created_at_first%3Adesc"
 
 # pylint: enable=line-too-long
 
+# The links end with the id of the listing ("...-t2-lisboa-ID1fqsY"), which
+# is kept when the title, and so the rest of the link, changes
+LISTING_ID_PATTERN = re.compile(r"(?:^|[-/])ID([0-9A-Za-z]+)$")
+
+# Slugs of the districts, searched as SEARCH_PATH/<district>/
+DISTRICTS = (
+    "aveiro",
+    "beja",
+    "braga",
+    "braganca",
+    "castelo-branco",
+    "coimbra",
+    "evora",
+    "faro",
+    "guarda",
+    "leiria",
+    "lisboa",
+    "portalegre",
+    "porto",
+    "santarem",
+    "setubal",
+    "viana-do-castelo",
+    "vila-real",
+    "viseu",
+    "acores",
+    "madeira",
+)
+
+
 class ImovirtualScrapper(WebsiteScrapper):
     """_summary_
 
@@ -28,12 +67,31 @@ class ImovirtualScrapper(WebsiteScrapper):
         WebsiteScrapper (_type_): _description_
     """
 
-    def get_house(self, link : str) -> Tuple[dict, datetime]:
+    def __init__(self, base_url: str = BASE_URL):
+        """
+        Constructor
+
+        Args:
+            base_url (str, optional): URL of the website, the search URLs are
+                relative to it. Defaults to BASE_URL.
+        """
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+
+    def get_raw_house(self, link: str) -> str:
+        """
+        Returns the HTML page of the house
+        """
+        try:
+            return get_until_success(link).text
+        except requests.HTTPError as error:
+            raise HouseUnavailableError(link) from error
+
+    def parse_house(self, raw: str, link: str) -> Tuple[dict, datetime]:
         """
-        Returns a House object with the data from the link
+        Returns a House object with the data from the HTML page of the house
         """
-        page = get_until_success(link)
-        bs_page = BeautifulSoup(page.text, "html.parser")
+        bs_page = BeautifulSoup(raw, "html.parser")
 
         # Get Json data
         json_data = bs_page.find("script", {"id": "__NEXT_DATA__"}).text
@@ -75,6 +133,9 @@ class ImovirtualScrapper(WebsiteScrapper):
             "longitude"
         ]
         selected_data["latitude"] = data["location"]["coordinates"]["latitude"]
+        selected_data[GEO_FIELD] = make_point(
+            selected_data["latitude"], selected_data["longitude"]
+        )
 
         # Flatten address
         for key, val in data["location"]["address"].items():
@@ -92,14 +153,27 @@ class ImovirtualScrapper(WebsiteScrapper):
     def get_provider_name(self):
         return "imovirtual"
 
+    def get_house_id(self, link: str) -> str:
+        """
+        Returns the id of the listing at the end of the link,
+        or the link if it has none
+        """
+        path = urlparse(link).path.rstrip("/")
+        match = LISTING_ID_PATTERN.search(path)
+        return match.group(1) if match else link
+
     def is_get_house_request(self) -> bool:
         return True
 
+    def get_locations(self) -> List[str]:
+        return list(DISTRICTS)
+
     def get_house_list(
         self,
         location: str = None,
         min_date: datetime = None,
         max_houses: int = 9999999,
+        watermark: Set[str] = None,
     ) -> List[str]:
         """
         Returns a list of links to houses
@@ -107,21 +181,29 @@ class ImovirtualScrapper(WebsiteScrapper):
 
         # Set URL
         if min_date is not None:
+            # Include the partial day elapsed since min_date
+            days_elapsed = (datetime.now(timezone.utc) - to_utc(min_date)).days
             curr_url = URL_SEARCH.replace(
-                "<DAYS_ELAPSED>", str((datetime.now() - min_date).days)
+                "<DAYS_ELAPSED>", str(days_elapsed + 1)
             )
         else:
             curr_url = URL
 
-        page = requests.get(curr_url, timeout=10)
-        page.raise_for_status()
+        if location is not None:
+            curr_url = curr_url.replace(
+                SEARCH_PATH, f"{SEARCH_PATH}{location}/", 1
+            )
+        curr_url = self.base_url + curr_url
+
+        if watermark:
+            return self._get_house_list_newest_first(
+                curr_url + ORDER_NEWEST_FIRST, max_houses, watermark
+            )
+
+        page = get_until_success(curr_url)
         bs_data = BeautifulSoup(page.text, "html.parser")
 
-        num_pages = int(
-            bs_data.find(
-                "li", {"class": "pager-next"}
-            ).previous_sibling.previous_sibling.a.text
-        )
+        num_pages = self.get_num_pages(bs_data)
 
         lst = []
 
@@ -148,6 +230,48 @@ class ImovirtualScrapper(WebsiteScrapper):
 
         return lst
 
+    def _get_house_list_newest_first(
+        self, curr_url: str, max_houses: int, watermark: Set[str]
+    ) -> List[str]:
+        """
+        Walk the pages sorted by the newest houses until the watermark is reached
+        """
+        listing = IncrementalListing(watermark, max_houses)
+        num_pages = None
+        i = 1
+
+        while num_pages is None or i <= num_pages:
+            new_url = curr_url.replace("page=1", f"page={i}")
+            LOGGER.info("Scrapping page %d with URL=%s", i, new_url)
+
+            bs_data = BeautifulSoup(get_until_success(new_url).text, "html.parser")
+            if num_pages is None:
+                num_pages = self.get_num_pages(bs_data)
+
+            # The links of a page are returned oldest first
+            links = self.get_houses_links_from_page(bs_data)
+            LOGGER.debug("Found %d house articles", len(links))
+            if not all(listing.add(link) for link in reversed(links)):
+                break
+            i += 1
+
+        LOGGER.info(
+            "Incremental listing stopped after %d of %d pages with %d new houses",
+            i,
+            num_pages,
+            len(listing.get_links()),
+        )
+        return listing.get_links()
+
+    def get_num_pages(self, bs_data: BeautifulSoup) -> int:
+        """
+        Get the number of pages of a search from its first page
+        """
+        pager_next = bs_data.find("li", {"class": "pager-next"})
+        if pager_next is None:
+            return 1
+        return int(pager_next.previous_sibling.previous_sibling.a.text)
+
 # pylint: disable=broad-except
     def get_houses_links_from_page(self, bs_data: BeautifulSoup) -> List[str]:
         """
@@ -0,0 +1,366 @@
+"""
+Module with the load test harness of the DataCollector.
+
+The harness starts the stand-in server of stand_in.py on a separate process,
+points the real scrappers at it and calls run_once once per epoch of the
+synthetic site. Every run reports the houses processed per second, the p50
+and p99 latency of a house, the peak RSS of the collector and the number of
+database operations by type.
+
+Example:
+    python -m house_collector.loadtest --houses 1000000 --runs 3 \\
+        --latency_ms 50 --rate_429 0.01 --rate_5xx 0.01 --storage sqlite
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+
+import requests
+
+from house_collector import stand_in, utils
+from house_collector.data_collector import DataCollector
+from house_collector.imovirtual_scrapper import ImovirtualScrapper
+from house_collector.olx_scrapper import OlxScrapper
+from house_collector.storage import STORAGE_MONGO, STORAGE_SQLITE
+
+LOGGER = logging.getLogger("LoadTest")
+
+DB_NAME = "houses_loadtest"
+# Seconds to wait before retrying a request to the stand-in server
+RETRY_DELAY_SEC = 0.1
+PROVIDERS = ("imovirtual", "olx")
+
+
+class OperationCounter:
+    """
+    Thread safe counter of the database operations by type
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts: Counter = Counter()
+
+    def add(self, operation: str):
+        """
+        Count an operation
+        """
+        with self.lock:
+            self.counts[operation] += 1
+
+    def pop(self) -> Dict[str, int]:
+        """
+        Get the counts and reset them
+        """
+        with self.lock:
+            counts = dict(self.counts)
+            self.counts.clear()
+        return counts
+
+
+def _register_mongo_counter(counter: OperationCounter):
+    """
+    Count the commands of the MongoDB clients created from now on
+    """
+    # pylint: disable=import-outside-toplevel
+    from pymongo import monitoring
+
+    # pylint: enable=import-outside-toplevel
+
+    class CommandCounter(monitoring.CommandListener):
+        """
+        Counts the commands sent to MongoDB
+        """
+
+        def started(self, event):
+            counter.add(event.command_name)
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+    monitoring.register(CommandCounter())
+
+
+class LoadTestCollector(DataCollector):
+    """
+    DataCollector that records the outcome and the latency of every house
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.outcomes: Counter = Counter()
+
+    def process_house(self, house_link: str, scrapper) -> bool:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            written = super().process_house(house_link, scrapper)
+            outcome = "written" if written else "unavailable"
+            return written
+        finally:
+            latency = time.perf_counter() - start
+            with self.lock:
+                self.latencies.append(latency)
+                self.outcomes[outcome] += 1
+
+    def pop_stats(self):
+        """
+        Get the latencies and the outcomes recorded and reset them
+        """
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+            outcomes, self.outcomes = self.outcomes, Counter()
+        return latencies, outcomes
+
+
+def create_stand_in_scrappers(url: str, providers=PROVIDERS) -> list:
+    """
+    Create the scrappers of the providers pointed at a stand-in server
+    """
+    scrappers = {
+        "imovirtual": lambda: ImovirtualScrapper(
+            url + stand_in.IMOVIRTUAL_PREFIX
+        ),
+        "olx": lambda: OlxScrapper(url + stand_in.OLX_PREFIX),
+    }
+    return [scrappers[provider]() for provider in providers]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Get a percentile of some values, 0 if there are none
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[int(round(fraction * (len(values) - 1)))]
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process, in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports it in KB and macOS in bytes
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _serve(parsed_args, url_queue):
+    """
+    Run the stand-in server, on its own process so its CPU and memory
+    are not measured as the collector's
+    """
+    server = stand_in.create_server(parsed_args)
+    url_queue.put(server.url)
+    server.http_server.serve_forever()
+
+
+def set_epoch(url: str, epoch: int):
+    """
+    Move the site of a stand-in server to an epoch
+    """
+    response = requests.get(
+        f"{url}{stand_in.CONTROL_PATH}", params={"set": epoch}, timeout=10
+    )
+    response.raise_for_status()
+    LOGGER.info("Stand-in site at epoch %s", response.json())
+
+
+def run_load_test(parsed_args) -> List[dict]:
+    """
+    Run the load test described by the parsed arguments
+
+    Returns:
+        List[dict]: the report of every run
+    """
+    url_queue: multiprocessing.Queue = multiprocessing.Queue()
+    server_process = multiprocessing.Process(
+        target=_serve, args=(parsed_args, url_queue), daemon=True
+    )
+    server_process.start()
+    url = url_queue.get(timeout=30)
+
+    counter = OperationCounter()
+    if parsed_args.storage == STORAGE_MONGO:
+        _register_mongo_counter(counter)
+
+    utils.RETRY_DELAY_SEC = parsed_args.retry_delay
+    collector = LoadTestCollector(
+        db_host=parsed_args.host,
+        db_port=parsed_args.port,
+        max_threads=parsed_args.threads,
+        use_threading=True,
+        storage=parsed_args.storage,
+        sqlite_path=parsed_args.sqlite_path,
+        providers=parsed_args.providers,
+        time_budget_min=parsed_args.time_budget_min,
+        partition=parsed_args.partition,
+    )
+    collector.scrapper_list = create_stand_in_scrappers(
+        url, parsed_args.providers
+    )
+
+    if parsed_args.storage == STORAGE_MONGO:
+        # pylint: disable=import-outside-toplevel
+        from house_collector.db_handler import DBHandler
+
+        # pylint: enable=import-outside-toplevel
+
+        # Never write the load test into the database of the collector
+        collector.db_handler.close()
+        collector.db_handler = DBHandler(
+            parsed_args.host, parsed_args.port, parsed_args.db_name
+        )
+        collector.db_handler.client.drop_database(parsed_args.db_name)
+    else:
+        collector.db_handler.connection.set_trace_callback(
+            lambda statement: counter.add(statement.split(None, 1)[0].upper())
+        )
+    counter.pop()
+
+    reports = []
+    try:
+        for epoch in range(parsed_args.runs):
+            set_epoch(url, epoch)
+            start = time.perf_counter()
+            collector.run_once()
+            elapsed = time.perf_counter() - start
+
+            latencies, outcomes = collector.pop_stats()
+            processed = outcomes["written"] + outcomes["unavailable"]
+            reports.append(
+                {
+                    "run": epoch,
+                    "seconds": elapsed,
+                    "outcomes": dict(outcomes),
+                    "houses_per_sec": processed / elapsed if elapsed else 0.0,
+                    "p50_ms": percentile(latencies, 0.5) * 1000,
+                    "p99_ms": percentile(latencies, 0.99) * 1000,
+                    "peak_rss_mb": peak_rss_mb(),
+                    "db_operations": counter.pop(),
+                }
+            )
+            print_report(reports[-1])
+    finally:
+        collector.db_handler.close()
+        server_process.terminate()
+        server_process.join()
+
+    return reports
+
+
+def print_report(report: dict):
+    """
+    Print the report of a run
+    """
+    operations = ", ".join(
+        f"{operation}={count}"
+        for operation, count in sorted(report["db_operations"].items())
+    )
+    outcomes = ", ".join(
+        f"{outcome}={count}"
+        for outcome, count in sorted(report["outcomes"].items())
+    )
+    print(
+        f"Run {report['run']}: {report['seconds']:.1f}s, "
+        f"{report['houses_per_sec']:.1f} houses/sec, "
+        f"p50 {report['p50_ms']:.1f}ms, p99 {report['p99_ms']:.1f}ms, "
+        f"peak RSS {report['peak_rss_mb']:.1f}MB\n"
+        f"  houses: {outcomes or 'none'}\n"
+        f"  db operations: {operations or 'none'}",
+        flush=True,
+    )
+
+
+def main():
+    """
+    Run a load test from the command line
+    """
+    parser = argparse.ArgumentParser(
+        description="Load test the collector against a local stand-in "
+        "of the websites"
+    )
+    stand_in.add_arguments(parser)
+    parser.add_argument(
+        "--runs",
+        default=2,
+        type=int,
+        help="Number of runs, every run is a new epoch of the site",
+    )
+    parser.add_argument(
+        "--providers", nargs="+", default=list(PROVIDERS), choices=PROVIDERS
+    )
+    parser.add_argument("--threads", default=100, type=int)
+    parser.add_argument(
+        "--partition",
+        action="store_true",
+        help="List every location of the site separately",
+    )
+    parser.add_argument(
+        "--time_budget_min",
+        default=None,
+        type=float,
+        help="Wall-clock budget of every run, in minutes",
+    )
+    parser.add_argument(
+        "--retry_delay",
+        default=RETRY_DELAY_SEC,
+        type=float,
+        help="Seconds to wait before retrying a failed request",
+    )
+    parser.add_argument(
+        "--storage",
+        default=STORAGE_SQLITE,
+        choices=(STORAGE_MONGO, STORAGE_SQLITE),
+    )
+    parser.add_argument(
+        "--sqlite_path",
+        default=None,
+        type=str,
+        help="Database file of the sqlite storage, a temporary one if not set",
+    )
+    parser.add_argument("--host", default="localhost", type=str)
+    parser.add_argument("--port", default=27017, type=int)
+    parser.add_argument(
+        "--db_name",
+        default=DB_NAME,
+        type=str,
+        help="MongoDB database, dropped when the test starts",
+    )
+    parser.add_argument("-d", "--debug", action="store_true")
+    parsed_args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if parsed_args.debug else logging.ERROR
+    )
+    if parsed_args.storage == STORAGE_MONGO:
+        # pylint: disable=import-outside-toplevel
+        from house_collector.db_handler import DB_NAME as COLLECTOR_DB_NAME
+
+        # pylint: enable=import-outside-toplevel
+        if parsed_args.db_name == COLLECTOR_DB_NAME:
+            parser.error("--db_name must not be the database of the collector")
+    if parsed_args.storage == STORAGE_SQLITE and not parsed_args.sqlite_path:
+        parsed_args.sqlite_path = os.path.join(
+            tempfile.mkdtemp(prefix="house_collector_"), "loadtest.sqlite"
+        )
+        print(f"Writing to {parsed_args.sqlite_path}", flush=True)
+
+    run_load_test(parsed_args)
+
+
+if __name__ == "__main__":
+    main()
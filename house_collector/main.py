@@ -1,8 +1,6 @@
 import argparse
 import logging
 
-from house_collector.data_collector import DataCollector
-
 DB_HOST = "localhost"
 DB_PORT = 27017
 
@@ -12,13 +10,19 @@ def main():
     Main function
     """
 
+    # -h is used for the host, so the help is only available as --help
     parser = argparse.ArgumentParser(
-        description="Collects houses from different websites"
+        description="Collects houses from different websites",
+        add_help=False,
+    )
+    parser.add_argument(
+        "--help",
+        action="help",
+        help="Show this help message and exit",
     )
     parser.add_argument(
         "-h",
         "--host",
-        const=DB_HOST,
         default=DB_HOST,
         type=str,
         help="Database host",
@@ -26,58 +30,143 @@ def main():
     parser.add_argument(
         "-p",
         "--port",
-        const=DB_PORT,
         default=DB_PORT,
         type=int,
         help="Database port",
     )
+    parser.add_argument(
+        "--storage",
+        default="mongo",
+        choices=("mongo", "sqlite"),
+        help="Storage backend",
+    )
+    parser.add_argument(
+        "--sqlite_path",
+        default="houses.sqlite",
+        type=str,
+        help="Database file of the sqlite storage",
+    )
     parser.add_argument(
         "-m",
         "--multi_thread",
-        type=bool,
-        const=True,
-        default=False,
+        action="store_true",
         help="Whether to allow multi-threading",
     )
     parser.add_argument(
         "-n",
         "--num_max_threads",
-        const=100,
         default=100,
         type=int,
-        help="Whether to allow multi-threading",
+        help="Maximum number of threads",
     )
     parser.add_argument(
         "-t",
         "--check_interval_min",
-        const=30,
         default=30,
         type=int,
         help="Time to wait, in minutes, between checks",
     )
     parser.add_argument(
         "--run_once",
-        const=True,
-        default=False,
-        type=bool,
+        action="store_true",
         help="Run the program once and exit",
     )
     parser.add_argument(
         "-d",
         "--debug",
-        const=True,
-        default=False,
-        type=bool,
+        action="store_true",
         help="Whether to print the debug logs",
     )
     parser.add_argument(
         "-v",
         "--verbose",
-        const=True,
-        default=False,
-        type=bool,
+        action="store_true",
         help="Whether to print the logs to the console",
     )
+    parser.add_argument(
+        "--providers",
+        nargs="+",
+        default=None,
+        help="Providers to scrap, all the registered providers if not set",
+    )
+    parser.add_argument(
+        "--list_providers",
+        action="store_true",
+        help="Print the registered providers and exit",
+    )
+    parser.add_argument(
+        "--archive_dir",
+        default=None,
+        type=str,
+        help="Directory where the raw pages are archived, disabled if not set",
+    )
+    parser.add_argument(
+        "--search_dir",
+        default=None,
+        type=str,
+        help="Directory of the full-text search index, disabled if not set",
+    )
+    parser.add_argument(
+        "--events",
+        default=None,
+        type=str,
+        help='Sink of the house events: "jsonl:<path>", "socket:<path>" '
+        'or "mongo[:<collection>]", disabled if not set',
+    )
+    parser.add_argument(
+        "--replay_dead_letters",
+        action="store_true",
+        help="Process again the houses that failed in previous runs",
+    )
+    parser.add_argument(
+        "--reparse",
+        action="store_true",
+        help="Parse the archive again into the database and exit",
+    )
+    parser.add_argument(
+        "--processes",
+        default=None,
+        type=int,
+        help="Number of processes used to reparse the archive",
+    )
+    parser.add_argument(
+        "--time_budget_min",
+        default=None,
+        type=float,
+        help="Wall-clock budget of a run, in minutes, the houses left "
+        "are processed first by the next run",
+    )
+    parser.add_argument(
+        "--max_rechecks",
+        default=1000,
+        type=int,
+        help="Maximum number of stored houses checked again by a run",
+    )
+    parser.add_argument(
+        "--partition",
+        action="store_true",
+        help="List every location (district, region) of the websites "
+        "separately and in parallel",
+    )
+    parser.add_argument(
+        "--partition_threads",
+        default=8,
+        type=int,
+        help="Number of locations listed at the same time",
+    )
+    parser.add_argument(
+        "--profile",
+        default=None,
+        type=str,
+        help="Profile a single run and write the flamegraph and "
+        "the summary to this directory",
+    )
+    parser.add_argument(
+        "--profile_interval",
+        default=0.005,
+        type=float,
+        help="Sampling interval, in seconds, of the profiler",
+    )
 
     parsed_args = parser.parse_args()
 
@@ -88,18 +177,73 @@ def main():
 
     logging.debug("Parsed arguments: %s", parsed_args)
 
+    # The modules below are imported lazily so only the
+    # scrappers that are actually used pay their import cost
+    # pylint: disable=import-outside-toplevel
+    from house_collector import registry
+
+    if parsed_args.list_providers:
+        print("\n".join(registry.available_providers()))
+        return
+
+    for provider in parsed_args.providers or []:
+        if provider not in registry.available_providers():
+            parser.error(
+                f"Unknown provider {provider}, available providers are "
+                f"{', '.join(registry.available_providers())}"
+            )
+
+    if parsed_args.reparse:
+        from house_collector.archive import reparse_archive
+
+        if not parsed_args.archive_dir:
+            parser.error("--reparse requires --archive_dir")
+        reparse_archive(
+            parsed_args.archive_dir,
+            db_host=parsed_args.host,
+            db_port=parsed_args.port,
+            processes=parsed_args.processes,
+            storage=parsed_args.storage,
+            sqlite_path=parsed_args.sqlite_path,
+        )
+        return
+
+    from house_collector.data_collector import DataCollector
+
     collector = DataCollector(
         db_host=parsed_args.host,
         db_port=parsed_args.port,
         max_threads=parsed_args.num_max_threads,
         use_threading=parsed_args.multi_thread,
         check_interval_min=parsed_args.check_interval_min,
+        archive_dir=parsed_args.archive_dir,
+        search_dir=parsed_args.search_dir,
+        event_sink=parsed_args.events,
+        replay_dead_letters=parsed_args.replay_dead_letters,
+        storage=parsed_args.storage,
+        sqlite_path=parsed_args.sqlite_path,
+        providers=parsed_args.providers,
+        time_budget_min=parsed_args.time_budget_min,
+        max_rechecks=parsed_args.max_rechecks,
+        partition=parsed_args.partition,
+        partition_threads=parsed_args.partition_threads,
     )
 
-    if parsed_args.run_once:
-        collector.run_once()
-    else:
-        collector.run()
+    try:
+        if parsed_args.profile:
+            from house_collector.profiler import StageProfiler
+
+            with StageProfiler(
+                parsed_args.profile, interval=parsed_args.profile_interval
+            ):
+                collector.run_once()
+        elif parsed_args.run_once:
+            collector.run_once()
+        else:
+            collector.run()
+    finally:
+        collector.close()
+    # pylint: enable=import-outside-toplevel
 
 
 if __name__ == "__main__":
@@ -0,0 +1,213 @@
+"""
+Module with the normalization stage of the ingest path.
+
+The scrappers store the provider fields as they are published, so the same
+value can be a number, a string with units or a provider specific code.
+The normalization writes typed canonical fields, with the same names for
+every provider, so range queries can be answered by the database indexes.
+"""
+
+import re
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+# Canonical fields
+PRICE_CENTS_FIELD = "price_cents"
+UTIL_AREA_FIELD = "util_area_m2"
+BRUTE_AREA_FIELD = "brute_area_m2"
+FIELD_AREA_FIELD = "field_area_m2"
+BEDROOMS_FIELD = "bedrooms"
+BATHROOMS_FIELD = "bathrooms"
+CONDITION_FIELD = "condition"
+
+CANONICAL_FIELDS = (
+    PRICE_CENTS_FIELD,
+    UTIL_AREA_FIELD,
+    BRUTE_AREA_FIELD,
+    FIELD_AREA_FIELD,
+    BEDROOMS_FIELD,
+    BATHROOMS_FIELD,
+    CONDITION_FIELD,
+)
+
+# Values of the condition field
+CONDITION_NEW = "new"
+CONDITION_USED = "used"
+CONDITION_RENOVATED = "renovated"
+CONDITION_TO_RENOVATE = "to_renovate"
+CONDITION_UNDER_CONSTRUCTION = "under_construction"
+CONDITION_RUIN = "ruin"
+
+CONDITIONS = (
+    CONDITION_NEW,
+    CONDITION_USED,
+    CONDITION_RENOVATED,
+    CONDITION_TO_RENOVATE,
+    CONDITION_UNDER_CONSTRUCTION,
+    CONDITION_RUIN,
+)
+
+# Provider values of the condition, folded by _fold
+CONDITION_VALUES = {
+    "new": CONDITION_NEW,
+    "novo": CONDITION_NEW,
+    "ready_to_use": CONDITION_USED,
+    "used": CONDITION_USED,
+    "usado": CONDITION_USED,
+    "renovated": CONDITION_RENOVATED,
+    "renovado": CONDITION_RENOVATED,
+    "recuperado": CONDITION_RENOVATED,
+    "to_renovation": CONDITION_TO_RENOVATE,
+    "to_renovate": CONDITION_TO_RENOVATE,
+    "para_recuperar": CONDITION_TO_RENOVATE,
+    "para_remodelar": CONDITION_TO_RENOVATE,
+    "under_construction": CONDITION_UNDER_CONSTRUCTION,
+    "to_completion": CONDITION_UNDER_CONSTRUCTION,
+    "em_construcao": CONDITION_UNDER_CONSTRUCTION,
+    "em_projeto": CONDITION_UNDER_CONSTRUCTION,
+    "ruin": CONDITION_RUIN,
+    "ruina": CONDITION_RUIN,
+    "em_ruinas": CONDITION_RUIN,
+}
+
+# Provider fields of every canonical field, the first one found is used
+PROVIDER_FIELDS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "imovirtual": {
+        PRICE_CENTS_FIELD: ("price",),
+        UTIL_AREA_FIELD: ("m", "net_area"),
+        BRUTE_AREA_FIELD: ("gross_area",),
+        FIELD_AREA_FIELD: ("terrain_area", "plot_area"),
+        BEDROOMS_FIELD: ("rooms_num",),
+        BATHROOMS_FIELD: ("bathrooms_num",),
+        CONDITION_FIELD: ("construction_status",),
+    },
+    "olx": {
+        PRICE_CENTS_FIELD: ("price",),
+        UTIL_AREA_FIELD: ("area_util",),
+        BRUTE_AREA_FIELD: ("area_bruta",),
+        FIELD_AREA_FIELD: ("area_terreno",),
+        BEDROOMS_FIELD: ("tipologia", "quartos"),
+        BATHROOMS_FIELD: ("casas_de_banho", "wc"),
+        CONDITION_FIELD: ("estado", "condicao"),
+    },
+}
+
+NUMBER_PATTERN = re.compile(r"\d[\d\s.,]*")
+THOUSANDS_PATTERN = r"^\d{{1,3}}(\{}\d{{3}})+$"
+
+
+def _fold(value: str) -> str:
+    """
+    Lower case, remove the accents and join the words with underscores
+    """
+    value = unicodedata.normalize("NFKD", value.strip().lower())
+    value = "".join(char for char in value if not unicodedata.combining(char))
+    return re.sub(r"[\s\-/]+", "_", value)
+
+
+def parse_number(value) -> Optional[float]:
+    """
+    Convert a provider number into a float.
+    Accepts numbers and strings with units or currencies in the Portuguese
+    ("250 000 €", "1.234,5 m²") or in the English ("1,234.5") format
+
+    Args:
+        value: number or string
+
+    Returns:
+        Optional[float]: the number, or None if it cannot be parsed
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    match = NUMBER_PATTERN.search(str(value))
+    if match is None:
+        return None
+    number = re.sub(r"\s", "", match.group()).rstrip(".,")
+
+    if "," in number and "." in number:
+        # The last separator is the decimal one
+        decimal = "," if number.rfind(",") > number.rfind(".") else "."
+        thousands = "." if decimal == "," else ","
+        number = number.replace(thousands, "").replace(decimal, ".")
+    else:
+        for separator in (",", "."):
+            if separator not in number:
+                continue
+            if re.match(THOUSANDS_PATTERN.format(separator), number):
+                number = number.replace(separator, "")
+            else:
+                number = number.replace(separator, ".")
+
+    try:
+        return float(number)
+    except ValueError:
+        return None
+
+
+def parse_typology(value) -> Optional[int]:
+    """
+    Convert a provider typology ("3", "t3", "T3+1") into the number of bedrooms
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.search(r"\d+", str(value))
+    return int(match.group()) if match else None
+
+
+def parse_condition(value) -> Optional[str]:
+    """
+    Convert a provider condition into one of CONDITIONS
+    """
+    if not isinstance(value, str):
+        return None
+    return CONDITION_VALUES.get(_fold(value))
+
+
+def price_to_cents(price: Optional[float]) -> Optional[int]:
+    """
+    Convert a price in euros into cents
+    """
+    return None if price is None else int(round(price * 100))
+
+
+def _parse_area(value) -> Optional[float]:
+    area = parse_number(value)
+    return area if area is not None and area > 0 else None
+
+
+PARSERS = {
+    PRICE_CENTS_FIELD: lambda value: price_to_cents(parse_number(value)),
+    UTIL_AREA_FIELD: _parse_area,
+    BRUTE_AREA_FIELD: _parse_area,
+    FIELD_AREA_FIELD: _parse_area,
+    BEDROOMS_FIELD: parse_typology,
+    BATHROOMS_FIELD: parse_typology,
+    CONDITION_FIELD: parse_condition,
+}
+
+
+def normalize_house(provider: str, house: dict) -> dict:
+    """
+    Get the canonical fields of a house
+
+    Args:
+        provider (str): name of the provider
+        house (dict): house as parsed by the scrapper of the provider
+
+    Returns:
+        dict: the canonical fields that could be parsed, providers without
+            a mapping get an empty dict
+    """
+    canonical = {}
+    for field, provider_fields in PROVIDER_FIELDS.get(provider, {}).items():
+        for provider_field in provider_fields:
+            value = PARSERS[field](house.get(provider_field))
+            if value is not None:
+                canonical[field] = value
+                break
+    return canonical
@@ -1,19 +1,23 @@
 """Module responsible for scrapping Imovirtual.com"""
 
+import json
 import logging
 from datetime import datetime
-from typing import List, Tuple
+from typing import List, Optional, Set, Tuple
 
-import requests
-
-from house_collector.base_scrapper import WebsiteScrapper
-from house_collector.utils import get_until_success
+from house_collector.base_scrapper import IncrementalListing, WebsiteScrapper
+from house_collector.geo import GEO_FIELD, make_point
+from house_collector.utils import get_until_success, to_utc
 
 # pylint: disable=line-too-long
 
 LOGGER = logging.getLogger("OlxScrapper")
 RESULT_PER_PAGE = 40
-URL = f"https://www.olx.pt/api/v1/offers/?offset=0&limit={RESULT_PER_PAGE}&category_id=16&sort_by=created_at%3Adesc"
+BASE_URL = "https://www.olx.pt"
+URL = f"/api/v1/offers/?offset=0&limit={RESULT_PER_PAGE}&category_id=16&sort_by=created_at%3Adesc"
+URL_REGIONS = "/api/v1/regions/"
+# Status of the offers that are still listed
+OFFER_ACTIVE = "active"
 
 # pylint: enable=line-too-long
 
@@ -25,21 +29,50 @@ class OlxScrapper(WebsiteScrapper):
         WebsiteScrapper (_type_): _description_
     """
 
-    def __init__(self):
+    def __init__(self, base_url: str = BASE_URL):
+        """
+        Constructor
+
+        Args:
+            base_url (str, optional): URL of the website, the API URLs are
+                relative to it. Defaults to BASE_URL.
+        """
         super().__init__()
+        self.base_url = base_url.rstrip("/")
         self.houses = {}
 
     def get_house(self, link: str) -> Tuple[dict, datetime]:
         """
         Returns a House object with the data from the link
         """
+        return self.parse_house_data(self._get_house_data(link), link)
+
+    def get_raw_house(self, link: str) -> str:
+        """
+        Returns the offer JSON of the house, as listed by the API
+        """
+        return json.dumps(self._get_house_data(link))
+
+    def parse_house(self, raw: str, link: str) -> Tuple[dict, datetime]:
+        """
+        Returns a House object with the data from an offer JSON
+        """
+        return self.parse_house_data(json.loads(raw), link)
+
+    def get_house_id(self, link: str) -> str:
+        return str(self._get_house_data(link)["id"])
 
+    def _get_house_data(self, link: str) -> dict:
         # Get Json data
         if link not in self.houses:
             raise ValueError(f"Link {link} not found in houses")
 
-        data = self.houses[link]
+        return self.houses[link]
 
+    def parse_house_data(self, data: dict, link: str) -> Tuple[dict, datetime]:
+        """
+        Returns a House object with the data from an offer dict
+        """
         selected_data_keys = {
             "id",
             "title",
@@ -83,8 +116,11 @@ class OlxScrapper(WebsiteScrapper):
 
         # Flatten coords
         if "map" in data:
-            selected_data["longitude"] = data["map"]["lat"]
-            selected_data["latitude"] = data["map"]["lon"]
+            selected_data["latitude"] = data["map"]["lat"]
+            selected_data["longitude"] = data["map"]["lon"]
+            selected_data[GEO_FIELD] = make_point(
+                data["map"]["lat"], data["map"]["lon"]
+            )
 
         # Flatten address
         for key, val in data["location"].items():
@@ -125,27 +161,50 @@ class OlxScrapper(WebsiteScrapper):
     def get_provider_name(self):
         return "olx"
 
+    def get_house_expiry(self, house: dict) -> Optional[datetime]:
+        """
+        Offers that are no longer active already expired, the others
+        expire at their valid_to_time
+        """
+        if house.get("status", OFFER_ACTIVE) != OFFER_ACTIVE:
+            return house["created_time"]
+        return house.get("valid_to_time")
+
     def is_get_house_request(self) -> bool:
         return False
 
+    def get_locations(self) -> List[str]:
+        """
+        Returns the ids of the regions, searched with the region_id parameter
+        """
+        regions = get_until_success(self.base_url + URL_REGIONS).json()
+        return [str(region["id"]) for region in regions["data"]]
+
+    def start_listing(self):
+        # The houses are only kept until the next run
+        self.houses = {}
+
     def get_house_list(
         self,
         location: str = None,
         min_date: datetime = None,
         max_houses: int = 9999999,
+        watermark: Set[str] = None,
     ) -> List[str]:
         """
         Returns a list of links to houses
         """
 
-        if min_date is not None:
-            LOGGER.warning("min_date is not supported for OlxScrapper, thus it will be ignored")
-        
-        self.houses = {}
-        curr_url = URL
+        curr_url = self.base_url + URL
+        if location is not None:
+            curr_url += f"&region_id={location}"
 
-        page = requests.get(curr_url, timeout=10)
-        page.raise_for_status()
+        if min_date is not None or watermark:
+            return self._get_house_list_newest_first(
+                curr_url, min_date, max_houses, watermark
+            )
+
+        page = get_until_success(curr_url)
 
         json_data = page.json()
 
@@ -154,7 +213,7 @@ class OlxScrapper(WebsiteScrapper):
         lst = []
 
         LOGGER.info("Scrapping %d pages", num_pages)
-        for i in reversed(range(1, num_pages)):
+        for i in reversed(range(num_pages)):
             new_url = curr_url.replace(
                 "offset=0", f"offset={i*RESULT_PER_PAGE}"
             )
@@ -169,7 +228,8 @@ class OlxScrapper(WebsiteScrapper):
 
             LOGGER.debug("Found %d house articles", len(page_json["data"]))
 
-            for house in page_json["data"]:
+            # Pages are sorted newest first
+            for house in reversed(page_json["data"]):
                 lst.append(house["url"])
                 self.houses[house["url"]] = house
 
@@ -178,3 +238,52 @@ class OlxScrapper(WebsiteScrapper):
                 return lst[:max_houses]
 
         return lst
+
+    def _get_house_list_newest_first(
+        self,
+        curr_url: str,
+        min_date: datetime,
+        max_houses: int,
+        watermark: Set[str],
+    ) -> List[str]:
+        """
+        Walk the pages, which are sorted by creation date, until a few houses
+        older than min_date or of the watermark are reached
+        """
+        listing = IncrementalListing(watermark, max_houses)
+        min_date = to_utc(min_date) if min_date is not None else None
+        i = 0
+
+        while not listing.done:
+            new_url = curr_url.replace(
+                "offset=0", f"offset={i*RESULT_PER_PAGE}"
+            )
+            LOGGER.info("Scrapping page %d with URL=%s", i, new_url)
+
+            page_json = get_until_success(new_url).json()
+            LOGGER.debug("Found %d house articles", len(page_json["data"]))
+
+            for house in page_json["data"]:
+                if min_date is not None:
+                    created_time = datetime.strptime(
+                        house["created_time"], "%Y-%m-%dT%H:%M:%S%z"
+                    )
+                    if created_time < min_date:
+                        if not listing.add_older():
+                            break
+                        continue
+
+                self.houses[house["url"]] = house
+                if not listing.add(house["url"]):
+                    break
+
+            if len(page_json["data"]) < RESULT_PER_PAGE:
+                break
+            i += 1
+
+        LOGGER.info(
+            "Incremental listing stopped after %d pages with %d new houses",
+            i + 1,
+            len(listing.get_links()),
+        )
+        return listing.get_links()
@@ -0,0 +1,251 @@
+"""
+Module with a sampling profiler used to find where the time of a run goes.
+
+Every worker thread is sampled at a fixed interval and each sample is
+attributed to the provider and stage (listing, fetch, parse, write) the
+thread was in, which is set by the code through the stage context manager.
+The output is a collapsed stack file, that can be rendered by flamegraph.pl
+or speedscope, and a top-N summary per provider.
+"""
+
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+LOGGER = logging.getLogger("Profiler")
+
+STAGE_LISTING = "listing"
+STAGE_FETCH = "fetch"
+STAGE_PARSE = "parse"
+STAGE_WRITE = "write"
+STAGE_OTHER = "other"
+
+COLLAPSED_FILE = "profile.collapsed"
+SUMMARY_FILE = "profile_summary.txt"
+
+_ACTIVE: Optional["StageProfiler"] = None
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+def is_profiling() -> bool:
+    """
+    Whether a profiler is running
+    """
+    return _ACTIVE is not None
+
+
+def stage(provider: str, name: str):
+    """
+    Context manager that attributes the time of the current thread to a stage.
+    It does nothing when no profiler is running
+
+    Args:
+        provider (str): name of the provider
+        name (str): name of the stage
+    """
+    profiler = _ACTIVE
+    if profiler is None:
+        return _NULL_CONTEXT
+    return profiler.stage(provider, name)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}.{code.co_name}"
+
+
+class StageProfiler:
+    """
+    Sampling profiler that attributes samples to providers and stages
+    """
+
+    def __init__(
+        self, output_dir: str, interval: float = 0.005, top_n: int = 20
+    ):
+        """
+        Constructor
+
+        Args:
+            output_dir (str): directory where the output is written
+            interval (float, optional): sampling interval in seconds.
+                Defaults to 0.005.
+            top_n (int, optional): number of functions in the summary.
+                Defaults to 20.
+        """
+        self.output_dir = output_dir
+        self.interval = interval
+        self.top_n = top_n
+
+        # Current (provider, stage) of each thread
+        self.thread_stages: Dict[int, Tuple[str, str]] = {}
+        self.stage_time: Dict[Tuple[str, str], float] = defaultdict(float)
+        self.stacks: Counter = Counter()
+        self.num_samples = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._main_thread_id = threading.get_ident()
+        self._start_time = 0.0
+        self._end_time = 0.0
+
+    @contextlib.contextmanager
+    def stage(self, provider: str, name: str):
+        """
+        Attribute the time of the current thread to a stage
+        """
+        thread_id = threading.get_ident()
+        previous = self.thread_stages.get(thread_id)
+        self.thread_stages[thread_id] = (provider, name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if previous is None:
+                self.thread_stages.pop(thread_id, None)
+            else:
+                self.thread_stages[thread_id] = previous
+            with self._lock:
+                self.stage_time[(provider, name)] += elapsed
+
+    def start(self):
+        """
+        Start sampling every thread
+        """
+        # pylint: disable=global-statement
+        global _ACTIVE
+        # pylint: enable=global-statement
+        if _ACTIVE is not None:
+            raise RuntimeError("A profiler is already running")
+
+        _ACTIVE = self
+        self._start_time = time.perf_counter()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._sample_loop, name="StageProfiler", daemon=True
+        )
+        self._thread.start()
+        LOGGER.info("Profiler started with interval %fs", self.interval)
+
+    def stop(self):
+        """
+        Stop sampling and write the output
+        """
+        # pylint: disable=global-statement
+        global _ACTIVE
+        # pylint: enable=global-statement
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        _ACTIVE = None
+        self._end_time = time.perf_counter()
+        self.write()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_args):
+        self.stop()
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+
+                label = self.thread_stages.get(thread_id)
+                if label is None:
+                    # Idle pool threads are ignored, the main thread
+                    # is accounted as other
+                    if thread_id != self._main_thread_id:
+                        continue
+                    label = ("all", STAGE_OTHER)
+
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.reverse()
+
+                self.stacks[(label[0], label[1], ";".join(stack))] += 1
+                self.num_samples += 1
+
+    def _samples_by_provider(self) -> Dict[str, List[Tuple[str, str, int]]]:
+        by_provider = defaultdict(list)
+        for (provider, stage_name, stack), count in self.stacks.items():
+            by_provider[provider].append((stage_name, stack, count))
+        return by_provider
+
+    def summary(self) -> str:
+        """
+        Get a text summary with the time per stage and the
+        top functions of each provider
+        """
+        lines = [
+            f"Duration: {self._end_time - self._start_time:.2f}s, "
+            f"{self.num_samples} samples every {self.interval}s",
+            "",
+            "Wall time per stage (summed over threads):",
+        ]
+        for (provider, stage_name), seconds in sorted(self.stage_time.items()):
+            lines.append(f"  {provider:<12} {stage_name:<8} {seconds:10.2f}s")
+
+        for provider, samples in sorted(self._samples_by_provider().items()):
+            total = sum(count for _, _, count in samples)
+            stages: Counter = Counter()
+            self_time: Counter = Counter()
+            inclusive: Counter = Counter()
+            for stage_name, stack, count in samples:
+                frames = stack.split(";")
+                stages[stage_name] += count
+                self_time[frames[-1]] += count
+                for frame in set(frames):
+                    inclusive[frame] += count
+
+            lines += ["", f"Provider {provider}: {total} samples"]
+            for stage_name, count in stages.most_common():
+                lines.append(
+                    f"  {stage_name:<8} {count:8d} {100 * count / total:6.1f}%"
+                )
+            lines.append(f"  Top {self.top_n} functions by self samples:")
+            for frame, count in self_time.most_common(self.top_n):
+                lines.append(
+                    f"    {count:8d} {100 * count / total:6.1f}%  {frame}"
+                )
+            lines.append(f"  Top {self.top_n} functions by inclusive samples:")
+            for frame, count in inclusive.most_common(self.top_n):
+                lines.append(
+                    f"    {count:8d} {100 * count / total:6.1f}%  {frame}"
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """
+        Write the collapsed stacks and the summary to the output directory
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        collapsed_path = os.path.join(self.output_dir, COLLAPSED_FILE)
+        with open(collapsed_path, "w", encoding="utf-8") as file:
+            for (provider, stage_name, stack), count in self.stacks.items():
+                file.write(f"{provider};{stage_name};{stack} {count}\n")
+
+        summary = self.summary()
+        summary_path = os.path.join(self.output_dir, SUMMARY_FILE)
+        with open(summary_path, "w", encoding="utf-8") as file:
+            file.write(summary)
+
+        LOGGER.info(
+            "Profile written to %s and %s", collapsed_path, summary_path
+        )
+        LOGGER.info("Profile summary:\n%s", summary)
@@ -0,0 +1,93 @@
+"""
+Module responsible for discovering and loading the scrappers.
+
+Scrappers are registered as entry points of the "house_collector.scrappers"
+group and their modules are only imported when a scrapper is loaded, so a
+run only pays the import cost of the providers it actually uses.
+"""
+
+import importlib
+import logging
+from typing import Dict, List
+
+from house_collector.base_scrapper import WebsiteScrapper
+
+LOGGER = logging.getLogger("Registry")
+ENTRY_POINT_GROUP = "house_collector.scrappers"
+
+# Used when the package is not installed and entry points are not available
+BUILTIN_SCRAPPERS = {
+    "imovirtual": "house_collector.imovirtual_scrapper:ImovirtualScrapper",
+    "olx": "house_collector.olx_scrapper:OlxScrapper",
+}
+
+_SCRAPPER_PATHS: Dict[str, str] = {}
+
+
+def get_scrapper_paths() -> Dict[str, str]:
+    """
+    Get the "module:class" path of every registered scrapper by provider name
+
+    Returns:
+        Dict[str, str]: the paths of the scrappers
+    """
+    if not _SCRAPPER_PATHS:
+        # pylint: disable=import-outside-toplevel
+        from importlib.metadata import entry_points
+
+        # pylint: enable=import-outside-toplevel
+
+        _SCRAPPER_PATHS.update(BUILTIN_SCRAPPERS)
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            _SCRAPPER_PATHS[entry_point.name] = entry_point.value
+
+    return _SCRAPPER_PATHS
+
+
+def available_providers() -> List[str]:
+    """
+    Get the name of every registered provider
+    """
+    return sorted(get_scrapper_paths())
+
+
+def load_scrapper(provider: str) -> WebsiteScrapper:
+    """
+    Import and instantiate the scrapper of a provider
+
+    Args:
+        provider (str): name of the provider
+
+    Raises:
+        ValueError: if the provider is not registered
+
+    Returns:
+        WebsiteScrapper: a new scrapper instance
+    """
+    paths = get_scrapper_paths()
+    if provider not in paths:
+        raise ValueError(
+            f"Unknown provider {provider}, "
+            f"available providers are {', '.join(available_providers())}"
+        )
+
+    module_name, class_name = paths[provider].split(":")
+    LOGGER.debug("Loading scrapper %s from %s", provider, paths[provider])
+    scrapper_class = getattr(importlib.import_module(module_name), class_name)
+    return scrapper_class()
+
+
+def load_scrappers(providers: List[str] = None) -> List[WebsiteScrapper]:
+    """
+    Load the scrappers of multiple providers
+
+    Args:
+        providers (List[str], optional): name of the providers.
+            Defaults to every registered provider.
+
+    Returns:
+        List[WebsiteScrapper]: the scrappers, in the given order
+    """
+    if not providers:
+        providers = available_providers()
+    return [load_scrapper(provider) for provider in dict.fromkeys(providers)]
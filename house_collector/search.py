@@ -0,0 +1,513 @@
+"""
+Module with the full-text search over the titles and descriptions of the houses.
+
+Each provider has its own positional inverted index, kept in memory and
+saved to a compact file (delta and varint encoded postings) in the index
+directory. Houses are indexed incrementally from the ingest path, an updated
+house gets a new document id and the old one is dropped, from the file and
+from memory, when the index is saved.
+"""
+
+import argparse
+import logging
+import os
+import re
+import struct
+import threading
+import unicodedata
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from house_collector.normalization import BEDROOMS_FIELD, PRICE_CENTS_FIELD
+
+LOGGER = logging.getLogger("SearchIndex")
+
+INDEX_SUFFIX = ".postings"
+INDEX_MAGIC = b"HCS1"
+TOKEN_REGEX = re.compile(r"[a-z0-9]+")
+
+# Words too common to be useful, positions are kept so phrases still match
+STOPWORDS = frozenset(
+    "a ao aos as com da das de do dos e em na nas no nos o os ou para "
+    "por que se um uma".split()
+)
+
+_NO_VALUE = struct.pack("<d", float("nan"))
+
+
+def fold(text: str) -> str:
+    """
+    Lower case a text and remove its accents ("Três Garagens" -> "tres garagens")
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[Tuple[str, int]]:
+    """
+    Split a text into (token, position) pairs, without stopwords
+
+    Args:
+        text (str): text to tokenize
+
+    Returns:
+        List[Tuple[str, int]]: the tokens and their position in the text
+    """
+    return [
+        (token, position)
+        for position, token in enumerate(TOKEN_REGEX.findall(fold(text)))
+        if token not in STOPWORDS
+    ]
+
+
+def _write_varint(buffer: bytearray, value: int):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _write_str(buffer: bytearray, value: str):
+    encoded = value.encode("utf-8")
+    _write_varint(buffer, len(encoded))
+    buffer += encoded
+
+
+def _read_str(data: bytes, offset: int) -> Tuple[str, int]:
+    length, offset = _read_varint(data, offset)
+    return data[offset : offset + length].decode("utf-8"), offset + length
+
+
+class ProviderIndex:
+    """
+    Positional inverted index of the houses of a single provider.
+    Not thread safe, the locking is done by SearchIndex
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        # term -> {doc id -> positions}
+        self.postings: Dict[str, Dict[int, List[int]]] = {}
+        # doc id -> (house id, price, typology), None if deleted
+        self.docs: List[
+            Optional[Tuple[str, Optional[float], Optional[int]]]
+        ] = []
+        self.doc_ids: Dict[str, int] = {}
+        self.doc_texts: Dict[int, int] = {}
+        self.dirty = False
+
+    def add(
+        self,
+        house_id: str,
+        text: str,
+        price: float = None,
+        typology: int = None,
+    ):
+        """
+        Index a house, replacing the previous version if it exists
+
+        Args:
+            house_id (str): id of the house
+            text (str): text to index
+            price (float, optional): price of the house. Defaults to None.
+            typology (int, optional): number of bedrooms. Defaults to None.
+        """
+        text_hash = zlib.crc32(text.encode("utf-8"))
+        doc_id = self.doc_ids.get(house_id)
+        if doc_id is not None and self.doc_texts.get(doc_id) == text_hash:
+            # Same text, only the filters may have changed
+            if self.docs[doc_id] != (house_id, price, typology):
+                self.docs[doc_id] = (house_id, price, typology)
+                self.dirty = True
+            return
+
+        if doc_id is not None:
+            self.docs[doc_id] = None
+            del self.doc_texts[doc_id]
+
+        doc_id = len(self.docs)
+        self.docs.append((house_id, price, typology))
+        self.doc_ids[house_id] = doc_id
+        self.doc_texts[doc_id] = text_hash
+
+        for token, position in tokenize(text):
+            self.postings.setdefault(token, {}).setdefault(doc_id, []).append(
+                position
+            )
+        self.dirty = True
+
+    def remove(self, house_id: str):
+        """
+        Remove a house from the index
+        """
+        doc_id = self.doc_ids.pop(house_id, None)
+        if doc_id is not None:
+            self.docs[doc_id] = None
+            self.doc_texts.pop(doc_id, None)
+            self.dirty = True
+
+    def search(
+        self,
+        terms: List[str],
+        phrases: List[List[Tuple[str, int]]],
+        typology: int = None,
+        min_price: float = None,
+        max_price: float = None,
+    ) -> List[Tuple[int, str]]:
+        """
+        Get the houses containing every term and phrase
+
+        Returns:
+            List[Tuple[int, str]]: (score, house id) of the houses found
+        """
+        required = set(terms)
+        for phrase in phrases:
+            required.update(token for token, _ in phrase)
+        if not required:
+            return []
+
+        postings = []
+        for term in required:
+            term_postings = self.postings.get(term)
+            if not term_postings:
+                return []
+            postings.append(term_postings)
+
+        # Intersect starting with the rarest term
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for term_postings in postings[1:]:
+            candidates.intersection_update(term_postings)
+            if not candidates:
+                return []
+
+        results = []
+        for doc_id in candidates:
+            doc = self.docs[doc_id]
+            if doc is None:
+                continue
+            house_id, price, house_typology = doc
+            if typology is not None and house_typology != typology:
+                continue
+            if min_price is not None and (price is None or price < min_price):
+                continue
+            if max_price is not None and (price is None or price > max_price):
+                continue
+            if not all(self._has_phrase(doc_id, phrase) for phrase in phrases):
+                continue
+
+            score = sum(
+                len(term_postings[doc_id]) for term_postings in postings
+            )
+            results.append((score, house_id))
+
+        return results
+
+    def _has_phrase(self, doc_id: int, phrase: List[Tuple[str, int]]) -> bool:
+        first_token, first_position = phrase[0]
+        starts = {
+            position - first_position
+            for position in self.postings[first_token][doc_id]
+        }
+        for token, offset in phrase[1:]:
+            positions = set(self.postings[token][doc_id])
+            starts = {start for start in starts if start + offset in positions}
+            if not starts:
+                return False
+        return True
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the index, dropping the deleted documents
+        """
+        # Renumber the live documents so the doc ids stay dense
+        remap = {}
+        buffer = bytearray(INDEX_MAGIC)
+        live = [(doc_id, doc) for doc_id, doc in enumerate(self.docs) if doc]
+        _write_varint(buffer, len(live))
+        for new_id, (doc_id, (house_id, price, typology)) in enumerate(live):
+            remap[doc_id] = new_id
+            _write_str(buffer, house_id)
+            buffer += (
+                struct.pack("<d", price) if price is not None else _NO_VALUE
+            )
+            _write_varint(buffer, typology + 1 if typology is not None else 0)
+            _write_varint(buffer, self.doc_texts[doc_id])
+
+        terms = []
+        for term, term_postings in self.postings.items():
+            docs = sorted(
+                (remap[doc_id], positions)
+                for doc_id, positions in term_postings.items()
+                if doc_id in remap
+            )
+            if docs:
+                terms.append((term, docs))
+
+        _write_varint(buffer, len(terms))
+        for term, docs in terms:
+            _write_str(buffer, term)
+            _write_varint(buffer, len(docs))
+            previous_doc = 0
+            for doc_id, positions in docs:
+                _write_varint(buffer, doc_id - previous_doc)
+                previous_doc = doc_id
+                _write_varint(buffer, len(positions))
+                previous_position = 0
+                for position in positions:
+                    _write_varint(buffer, position - previous_position)
+                    previous_position = position
+
+        return bytes(buffer)
+
+    @classmethod
+    def from_bytes(cls, provider: str, data: bytes) -> "ProviderIndex":
+        """
+        Load an index serialized by to_bytes
+        """
+        if data[: len(INDEX_MAGIC)] != INDEX_MAGIC:
+            raise ValueError(f"Invalid search index for {provider}")
+
+        index = cls(provider)
+        offset = len(INDEX_MAGIC)
+        num_docs, offset = _read_varint(data, offset)
+        for doc_id in range(num_docs):
+            house_id, offset = _read_str(data, offset)
+            (price,) = struct.unpack_from("<d", data, offset)
+            offset += 8
+            typology, offset = _read_varint(data, offset)
+            text_hash, offset = _read_varint(data, offset)
+            index.docs.append(
+                (
+                    house_id,
+                    None if price != price else price,
+                    typology - 1 if typology else None,
+                )
+            )
+            index.doc_ids[house_id] = doc_id
+            index.doc_texts[doc_id] = text_hash
+
+        num_terms, offset = _read_varint(data, offset)
+        for _ in range(num_terms):
+            term, offset = _read_str(data, offset)
+            num_term_docs, offset = _read_varint(data, offset)
+            term_postings = {}
+            doc_id = 0
+            for _ in range(num_term_docs):
+                delta, offset = _read_varint(data, offset)
+                doc_id += delta
+                num_positions, offset = _read_varint(data, offset)
+                positions = []
+                position = 0
+                for _ in range(num_positions):
+                    delta, offset = _read_varint(data, offset)
+                    position += delta
+                    positions.append(position)
+                term_postings[doc_id] = positions
+            index.postings[term] = term_postings
+
+        return index
+
+
+def parse_query(query: str) -> Tuple[List[str], List[List[Tuple[str, int]]]]:
+    """
+    Parse a query into keywords and phrases (quoted)
+
+    Args:
+        query (str): query such as 'piscina "vista mar"'
+
+    Returns:
+        Tuple[List[str], List[List[Tuple[str, int]]]]: the keywords and the
+            phrases as (token, offset from the first token)
+    """
+    terms = []
+    phrases = []
+    for part in re.findall(r'"([^"]*)"|(\S+)', query):
+        phrase, word = part
+        tokens = tokenize(phrase or word)
+        if not tokens:
+            continue
+        if phrase and len(tokens) > 1:
+            first_position = tokens[0][1]
+            phrases.append(
+                [
+                    (token, position - first_position)
+                    for token, position in tokens
+                ]
+            )
+        else:
+            terms.extend(token for token, _ in tokens)
+    return terms, phrases
+
+
+class SearchIndex:
+    """
+    Full-text index over the houses of every provider.
+    Thread safe
+    """
+
+    def __init__(self, directory: str):
+        """
+        Constructor
+
+        Args:
+            directory (str): directory where the index is saved
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.providers: Dict[str, ProviderIndex] = {}
+        self.lock = threading.Lock()
+
+        for name in os.listdir(directory):
+            if name.endswith(INDEX_SUFFIX):
+                provider = name[: -len(INDEX_SUFFIX)]
+                with open(os.path.join(directory, name), "rb") as file:
+                    self.providers[provider] = ProviderIndex.from_bytes(
+                        provider, file.read()
+                    )
+                LOGGER.info(
+                    "Loaded search index of %s with %d houses",
+                    provider,
+                    len(self.providers[provider].doc_ids),
+                )
+
+    def _get_provider(self, provider: str) -> ProviderIndex:
+        if provider not in self.providers:
+            self.providers[provider] = ProviderIndex(provider)
+        return self.providers[provider]
+
+    def add_house(self, provider: str, house: dict):
+        """
+        Index the title and the description of a house
+
+        Args:
+            provider (str): name of the provider
+            house (dict): house as inserted in the database
+        """
+        if not house.get("available", True):
+            self.remove_house(provider, house["_id"])
+            return
+
+        text = f"{house.get('title') or ''}\n{house.get('description') or ''}"
+        price_cents = house.get(PRICE_CENTS_FIELD)
+        with self.lock:
+            self._get_provider(provider).add(
+                str(house["_id"]),
+                text,
+                price=price_cents / 100 if price_cents is not None else None,
+                typology=house.get(BEDROOMS_FIELD),
+            )
+
+    def remove_house(self, provider: str, house_id):
+        """
+        Remove a house from the index
+        """
+        with self.lock:
+            self._get_provider(provider).remove(str(house_id))
+
+    def search(
+        self,
+        query: str,
+        provider: str = None,
+        typology: int = None,
+        min_price: float = None,
+        max_price: float = None,
+        limit: int = 50,
+    ) -> List[Tuple[str, str]]:
+        """
+        Search the houses matching every keyword and quoted phrase of a query
+
+        Args:
+            query (str): query such as 'piscina garagem "vista mar"'
+            provider (str, optional): only search this provider. Defaults to None.
+            typology (int, optional): number of bedrooms. Defaults to None.
+            min_price (float, optional): minimum price. Defaults to None.
+            max_price (float, optional): maximum price. Defaults to None.
+            limit (int, optional): maximum number of results. Defaults to 50.
+
+        Returns:
+            List[Tuple[str, str]]: (provider, house id) of the houses found,
+                best matches first
+        """
+        terms, phrases = parse_query(query)
+        results = []
+        with self.lock:
+            for name, index in self.providers.items():
+                if provider is not None and name != provider:
+                    continue
+                for score, house_id in index.search(
+                    terms, phrases, typology, min_price, max_price
+                ):
+                    results.append((-score, name, house_id))
+
+        results.sort()
+        return [(name, house_id) for _, name, house_id in results[:limit]]
+
+    def save(self):
+        """
+        Save the providers that changed since they were loaded
+        """
+        with self.lock:
+            for provider, index in self.providers.items():
+                if not index.dirty:
+                    continue
+                path = os.path.join(self.directory, provider + INDEX_SUFFIX)
+                data = index.to_bytes()
+                with open(path + ".tmp", "wb") as file:
+                    file.write(data)
+                os.replace(path + ".tmp", path)
+                index.dirty = False
+                if len(index.doc_ids) < len(index.docs):
+                    # The postings of the replaced and removed houses are
+                    # still in memory, load the compacted index instead
+                    self.providers[provider] = ProviderIndex.from_bytes(
+                        provider, data
+                    )
+                LOGGER.info(
+                    "Saved search index of %s with %d houses",
+                    provider,
+                    len(index.doc_ids),
+                )
+
+
+def main():
+    """
+    Query a search index from the command line
+    """
+    parser = argparse.ArgumentParser(description="Search the houses")
+    parser.add_argument("index_dir", type=str, help="Search index directory")
+    parser.add_argument(
+        "query", type=str, help="Query, e.g. 'piscina \"vista mar\"'"
+    )
+    parser.add_argument("--provider", default=None, type=str)
+    parser.add_argument("--typology", default=None, type=int)
+    parser.add_argument("--min_price", default=None, type=float)
+    parser.add_argument("--max_price", default=None, type=float)
+    parser.add_argument("--limit", default=50, type=int)
+    parsed_args = parser.parse_args()
+
+    index = SearchIndex(parsed_args.index_dir)
+    for provider, house_id in index.search(
+        parsed_args.query,
+        provider=parsed_args.provider,
+        typology=parsed_args.typology,
+        min_price=parsed_args.min_price,
+        max_price=parsed_args.max_price,
+        limit=parsed_args.limit,
+    ):
+        print(provider, house_id)
+
+
+if __name__ == "__main__":
+    main()
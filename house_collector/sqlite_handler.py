@@ -0,0 +1,598 @@
+"""
+Module with an embedded SQLite storage, an alternative to
+MongoDB that does not need a database server
+"""
+
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from house_collector.events import delisted_event, house_events
+from house_collector.geo import (
+    EARTH_RADIUS_M,
+    get_point_coordinates,
+    haversine_distance,
+)
+from house_collector.normalization import (
+    BEDROOMS_FIELD,
+    CONDITION_FIELD,
+    PRICE_CENTS_FIELD,
+    price_to_cents,
+)
+from house_collector.storage import (
+    EXPIRES_AT_FIELD,
+    LAST_CHECKED_FIELD,
+    PRICE_CHANGED_AT_FIELD,
+    StorageBackend,
+    track_price_change,
+)
+
+LOGGER = logging.getLogger("SQLiteHandler")
+
+# Writes are committed in batches, whatever limit is reached first
+BATCH_SIZE = 500
+BATCH_INTERVAL_SEC = 1.0
+
+# Maximum radius searched for the nearest houses
+MAX_SEARCH_RADIUS_M = math.pi * EARTH_RADIUS_M
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS houses (
+    provider TEXT NOT NULL,
+    id TEXT NOT NULL,
+    link TEXT,
+    available INTEGER NOT NULL DEFAULT 1,
+    date_modified REAL,
+    latitude REAL,
+    longitude REAL,
+    price_cents INTEGER,
+    bedrooms INTEGER,
+    condition TEXT,
+    last_checked REAL,
+    price_changed_at REAL,
+    expires_at REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (provider, id)
+);
+CREATE INDEX IF NOT EXISTS houses_date_modified
+    ON houses (provider, date_modified);
+CREATE INDEX IF NOT EXISTS houses_link ON houses (provider, link);
+CREATE TABLE IF NOT EXISTS crawl_state (
+    provider TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    provider TEXT NOT NULL,
+    link TEXT NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    date TEXT,
+    PRIMARY KEY (provider, link)
+);
+"""
+
+# Columns added to the databases created before they existed
+ADDED_COLUMNS = {
+    PRICE_CENTS_FIELD: "INTEGER",
+    BEDROOMS_FIELD: "INTEGER",
+    CONDITION_FIELD: "TEXT",
+    LAST_CHECKED_FIELD: "REAL",
+    PRICE_CHANGED_AT_FIELD: "REAL",
+    EXPIRES_AT_FIELD: "REAL",
+}
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"{type(value)} is not JSON serializable")
+
+
+def _decode(value: dict):
+    if len(value) == 1 and "$date" in value:
+        return datetime.fromisoformat(value["$date"])
+    return value
+
+
+def dumps(house: dict) -> str:
+    """
+    Serialize a house, keeping its datetimes
+    """
+    return json.dumps(house, default=_encode, ensure_ascii=False)
+
+
+def loads(data: str) -> dict:
+    """
+    Deserialize a house serialized by dumps
+    """
+    return json.loads(data, object_hook=_decode)
+
+
+def _timestamp(date) -> Optional[float]:
+    if not isinstance(date, datetime):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+class SQLiteHandler(StorageBackend):
+    """
+    Storage backend on a single SQLite file in WAL mode.
+    Every house is stored as JSON, with the fields used by the
+    queries copied into indexed columns.
+    Thread safe, the writes of every thread are committed in batches
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = BATCH_SIZE,
+        batch_interval_sec: float = BATCH_INTERVAL_SEC,
+    ):
+        """
+        Constructor
+
+        Args:
+            path (str): path of the database file, ":memory:" for a temporary one
+            batch_size (int, optional): number of writes per transaction.
+                Defaults to BATCH_SIZE.
+            batch_interval_sec (float, optional): maximum time a write waits to
+                be committed. Defaults to BATCH_INTERVAL_SEC.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_interval_sec = batch_interval_sec
+        self.event_sink = None
+
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, timeout=30, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._add_missing_columns()
+
+        self._pending_writes = 0
+        # Events of the writes of the current batch
+        self._pending_events: List[dict] = []
+        self._last_commit = time.monotonic()
+        LOGGER.debug("Opened SQLite database %s", path)
+
+    def _add_missing_columns(self):
+        columns = {
+            row[1]
+            for row in self.connection.execute("PRAGMA table_info(houses)")
+        }
+        for column, column_type in ADDED_COLUMNS.items():
+            if column not in columns:
+                self.connection.execute(
+                    f"ALTER TABLE houses ADD COLUMN {column} {column_type}"
+                )
+
+    def _write(self, query: str, parameters=(), events: List[dict] = None):
+        """
+        Execute a write in the current batch, must hold the lock.
+        The events of the write are emitted once the batch is committed
+        """
+        if not self.connection.in_transaction:
+            self.connection.execute("BEGIN")
+        cursor = self.connection.execute(query, parameters)
+        self._pending_writes += 1
+        if events and self.event_sink is not None:
+            self._pending_events.extend(events)
+        if (
+            self._pending_writes >= self.batch_size
+            or time.monotonic() - self._last_commit >= self.batch_interval_sec
+        ):
+            self._commit()
+        return cursor
+
+    def _commit(self):
+        if self.connection.in_transaction:
+            self.connection.execute("COMMIT")
+        self._pending_writes = 0
+        self._last_commit = time.monotonic()
+
+        # Only emitted once the writes are committed
+        events, self._pending_events = self._pending_events, []
+        for event in events:
+            self.event_sink.emit(event)
+
+    def flush(self):
+        with self.lock:
+            self._commit()
+
+    def _find_house(self, house_id, collection_name: str) -> Optional[dict]:
+        row = self.connection.execute(
+            "SELECT data FROM houses WHERE provider = ? AND id = ?",
+            (collection_name, str(house_id)),
+        ).fetchone()
+        return loads(row[0]) if row else None
+
+    def insert_house(self, data: dict, collection_name: str):
+        with self.lock:
+            old_record = self._find_house(data["_id"], collection_name)
+            if old_record is not None:
+                track_price_change(old_record, data)
+                # Same semantics as $set, the old fields are kept
+                new_record = dict(old_record, **data)
+                if new_record == old_record:
+                    LOGGER.debug(
+                        "House already exists in db, no action was preformed"
+                    )
+                    return
+            else:
+                new_record = data
+
+            coordinates = get_point_coordinates(new_record) or (None, None)
+            self._write(
+                "INSERT OR REPLACE INTO houses (provider, id, link, available, "
+                "date_modified, latitude, longitude, price_cents, bedrooms, "
+                "condition, last_checked, price_changed_at, expires_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    collection_name,
+                    str(data["_id"]),
+                    new_record.get("link"),
+                    int(bool(new_record.get("available", True))),
+                    _timestamp(new_record.get("date_modified")),
+                    coordinates[0],
+                    coordinates[1],
+                    new_record.get(PRICE_CENTS_FIELD),
+                    new_record.get(BEDROOMS_FIELD),
+                    new_record.get(CONDITION_FIELD),
+                    _timestamp(new_record.get(LAST_CHECKED_FIELD)),
+                    _timestamp(new_record.get(PRICE_CHANGED_AT_FIELD)),
+                    _timestamp(new_record.get(EXPIRES_AT_FIELD)),
+                    dumps(new_record),
+                ),
+                house_events(collection_name, old_record, data)
+                if self.event_sink is not None
+                else None,
+            )
+            LOGGER.debug(
+                "House %s was written into the table %s",
+                data["_id"],
+                collection_name,
+            )
+
+    def set_house_unavailable(self, link: str, collection_name: str):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM houses "
+                "WHERE provider = ? AND link = ? AND available = 1",
+                (collection_name, link),
+            ).fetchone()
+            if row is None:
+                return None
+
+            house = loads(row[0])
+            house["available"] = False
+            self._write(
+                "UPDATE houses SET available = 0, data = ? "
+                "WHERE provider = ? AND id = ?",
+                (dumps(house), collection_name, str(house["_id"])),
+                [delisted_event(collection_name, house["_id"])],
+            )
+            return house["_id"]
+
+    def get_latest_house(self, collection_name: str) -> Optional[dict]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM houses WHERE provider = ? "
+                "ORDER BY date_modified DESC LIMIT 1",
+                (collection_name,),
+            ).fetchone()
+        return loads(row[0]) if row else None
+
+    def get_crawl_state(self, collection_name: str) -> dict:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT state FROM crawl_state WHERE provider = ?",
+                (collection_name,),
+            ).fetchone()
+        return loads(row[0]) if row else {}
+
+    def set_crawl_state(self, collection_name: str, state: dict):
+        with self.lock:
+            new_state = dict(self.get_crawl_state(collection_name), **state)
+            self._write(
+                "INSERT OR REPLACE INTO crawl_state (provider, state) "
+                "VALUES (?, ?)",
+                (collection_name, dumps(new_state)),
+            )
+
+    def insert_dead_letter(
+        self, link: str, collection_name: str, error: str, attempts: int
+    ):
+        with self.lock:
+            self._write(
+                "INSERT INTO dead_letters "
+                "(provider, link, error, attempts, date) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (provider, link) DO UPDATE SET "
+                "error = excluded.error, date = excluded.date, "
+                "attempts = attempts + excluded.attempts",
+                (
+                    collection_name,
+                    link,
+                    error,
+                    attempts,
+                    datetime.now(timezone.utc).isoformat(),
+                ),
+            )
+
+    def get_dead_letters(self, collection_name: str) -> List[str]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT link FROM dead_letters WHERE provider = ?",
+                (collection_name,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def remove_dead_letters(self, collection_name: str, links: List[str]):
+        with self.lock:
+            for link in links:
+                self._write(
+                    "DELETE FROM dead_letters WHERE provider = ? AND link = ?",
+                    (collection_name, link),
+                )
+
+    def ensure_indexes(self, collection_name: str):
+        with self.lock:
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS houses_location "
+                "ON houses (provider, latitude, longitude)"
+            )
+            # Same order as the MongoDB indexes, the price range last
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS houses_bedrooms_price "
+                "ON houses (provider, available, bedrooms, price_cents)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS houses_condition_price "
+                "ON houses (provider, available, condition, price_cents)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS houses_price "
+                "ON houses (provider, available, price_cents)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS houses_last_checked "
+                "ON houses (provider, available, last_checked)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS houses_price_changed_at "
+                "ON houses (provider, available, price_changed_at)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS houses_expires_at "
+                "ON houses (provider, available, expires_at)"
+            )
+
+    @staticmethod
+    def _canonical_conditions(
+        typology: int = None,
+        min_price: float = None,
+        max_price: float = None,
+        condition: str = None,
+    ) -> Tuple[str, list]:
+        """
+        Get the SQL conditions, and their parameters,
+        equivalent to geo.comparables_filter
+        """
+        query = ""
+        parameters: list = []
+        if typology is not None:
+            query += " AND bedrooms = ?"
+            parameters.append(typology)
+        if condition is not None:
+            query += " AND condition = ?"
+            parameters.append(condition)
+        if min_price is not None:
+            query += " AND price_cents >= ?"
+            parameters.append(price_to_cents(min_price))
+        if max_price is not None:
+            query += " AND price_cents <= ?"
+            parameters.append(price_to_cents(max_price))
+        return query, parameters
+
+    def get_houses_to_recheck(
+        self,
+        collection_name: str,
+        checked_before: datetime,
+        limit: int,
+        changed_after: datetime = None,
+    ) -> List[dict]:
+        query = (
+            "SELECT data FROM houses WHERE provider = ? AND available = 1 "
+            "AND (last_checked < ? OR last_checked IS NULL)"
+        )
+        parameters: list = [collection_name, _timestamp(checked_before)]
+        if changed_after is not None:
+            query += " AND price_changed_at >= ?"
+            parameters.append(_timestamp(changed_after))
+        query += " ORDER BY last_checked LIMIT ?"
+        parameters.append(limit)
+
+        with self.lock:
+            rows = self.connection.execute(query, parameters).fetchall()
+        return [loads(row[0]) for row in rows]
+
+    def get_expired_houses(
+        self, collection_name: str, now: datetime
+    ) -> List[dict]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT data FROM houses WHERE provider = ? AND available = 1 "
+                "AND expires_at < ?",
+                (collection_name, _timestamp(now)),
+            ).fetchall()
+        return [loads(row[0]) for row in rows]
+
+    def get_houses(
+        self,
+        collection_name: str,
+        typology: int = None,
+        min_price: float = None,
+        max_price: float = None,
+        condition: str = None,
+        limit: int = None,
+    ) -> List[dict]:
+        conditions, parameters = self._canonical_conditions(
+            typology, min_price, max_price, condition
+        )
+        query = (
+            "SELECT data FROM houses WHERE provider = ? AND available = 1"
+            + conditions
+            + " ORDER BY price_cents"
+        )
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        with self.lock:
+            rows = self.connection.execute(
+                query, [collection_name] + parameters
+            ).fetchall()
+        return [loads(row[0]) for row in rows]
+
+    def _houses_in_box(
+        self,
+        collection_name: str,
+        latitude: float,
+        longitude: float,
+        radius_m: float,
+        conditions: str = "",
+        condition_parameters: list = None,
+    ) -> List[dict]:
+        """
+        Get the available houses in the bounding box of a circle
+        that match the extra SQL conditions
+        """
+        d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+        cos_lat = math.cos(math.radians(latitude))
+        if latitude + d_lat >= 90 or latitude - d_lat <= -90 or cos_lat < 1e-6:
+            d_lon = 180.0
+        else:
+            d_lon = min(180.0, d_lat / cos_lat)
+
+        query = (
+            "SELECT data FROM houses WHERE provider = ? AND available = 1 "
+            "AND latitude BETWEEN ? AND ?"
+        )
+        parameters = [collection_name, latitude - d_lat, latitude + d_lat]
+        if d_lon < 180:
+            min_lon, max_lon = longitude - d_lon, longitude + d_lon
+            if min_lon < -180 or max_lon > 180:
+                # The box crosses the antimeridian
+                query += " AND (longitude >= ? OR longitude <= ?)"
+                parameters += [
+                    (min_lon + 540) % 360 - 180,
+                    (max_lon + 540) % 360 - 180,
+                ]
+            else:
+                query += " AND longitude BETWEEN ? AND ?"
+                parameters += [min_lon, max_lon]
+        query += conditions
+        parameters += condition_parameters or []
+
+        with self.lock:
+            rows = self.connection.execute(query, parameters).fetchall()
+        return [loads(row[0]) for row in rows]
+
+    def get_houses_in_radius(
+        self,
+        collection_name: str,
+        latitude: float,
+        longitude: float,
+        radius_m: float,
+        typology: int = None,
+        min_price: float = None,
+        max_price: float = None,
+    ) -> List[dict]:
+        conditions, parameters = self._canonical_conditions(
+            typology, min_price, max_price
+        )
+        houses = []
+        for house in self._houses_in_box(
+            collection_name,
+            latitude,
+            longitude,
+            radius_m,
+            conditions,
+            parameters,
+        ):
+            distance = haversine_distance(
+                latitude, longitude, *get_point_coordinates(house)
+            )
+            if distance <= radius_m:
+                house["distance"] = distance
+                houses.append(house)
+        return houses
+
+    def get_nearest_houses(
+        self,
+        collection_name: str,
+        latitude: float,
+        longitude: float,
+        k: int = 10,
+        typology: int = None,
+        min_price: float = None,
+        max_price: float = None,
+        max_distance_m: float = None,
+    ) -> List[dict]:
+        limit = max_distance_m or MAX_SEARCH_RADIUS_M
+        radius_m = min(1000.0, limit)
+
+        # Grow the searched circle until it holds k houses
+        while True:
+            houses = self.get_houses_in_radius(
+                collection_name,
+                latitude,
+                longitude,
+                radius_m,
+                typology,
+                min_price,
+                max_price,
+            )
+            if len(houses) >= k or radius_m >= limit:
+                break
+            radius_m = min(radius_m * 4, limit)
+
+        houses.sort(key=lambda house: house["distance"])
+        return houses[:k]
+
+    def get_houses_with_location(
+        self, collection_name: str, projection: dict = None
+    ) -> Iterator[dict]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT data FROM houses WHERE provider = ? "
+                "AND available = 1 AND latitude IS NOT NULL",
+                (collection_name,),
+            ).fetchall()
+        for row in rows:
+            house = loads(row[0])
+            if projection:
+                house = {
+                    key: value
+                    for key, value in house.items()
+                    if key == "_id" or projection.get(key)
+                }
+            yield house
+
+    def close(self):
+        """
+        Commit the pending writes and close the database
+        """
+        with self.lock:
+            self._commit()
+            self.connection.close()
+        if self.event_sink is not None:
+            self.event_sink.close()
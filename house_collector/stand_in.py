@@ -0,0 +1,734 @@
+"""
+Module with a local stand-in for the websites, used to load test the
+DataCollector without touching the real sites.
+
+A SyntheticSite generates the houses lazily from their id, so millions of
+houses cost no memory and the same seed always produces the same houses.
+The site advances in epochs, one per run of the collector, and every epoch
+adds new listings, changes some prices and delists some houses.
+The StandInServer serves the site as Imovirtual-style HTML pages and an
+OLX-style JSON API, with injected latency, 429s and 5xx responses, so the
+real scrappers can be pointed at it with their base_url.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+LOGGER = logging.getLogger("StandIn")
+
+IMOVIRTUAL_PREFIX = "/imovirtual"
+OLX_PREFIX = "/olx"
+CONTROL_PATH = "/_control/epoch"
+
+# Houses of the listing order whose visibility is counted together
+BLOCK_SIZE = 1024
+START_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# The clock of the site is in the past, so the OLX offers are valid until
+# a fixed date instead of expiring in real time
+OLX_VALID_TO_TIME = datetime(2100, 1, 1, tzinfo=timezone.utc)
+# Time between the listings of the first epoch
+LISTING_INTERVAL_SEC = 60
+ERROR_STATUS_CODES = (500, 502, 503)
+
+# The Imovirtual locations are their slugs and the OLX ones their position + 1
+DISTRICTS = (
+    "Aveiro",
+    "Beja",
+    "Braga",
+    "Braganca",
+    "Castelo Branco",
+    "Coimbra",
+    "Evora",
+    "Faro",
+    "Guarda",
+    "Leiria",
+    "Lisboa",
+    "Portalegre",
+    "Porto",
+    "Santarem",
+    "Setubal",
+    "Viana do Castelo",
+    "Vila Real",
+    "Viseu",
+    "Acores",
+    "Madeira",
+)
+DISTRICT_SLUGS = {
+    name.lower().replace(" ", "-"): district
+    for district, name in enumerate(DISTRICTS)
+}
+IMOVIRTUAL_CONDITIONS = ("ready_to_use", "to_renovation", "to_completion")
+OLX_CONDITIONS = ("usado", "novo", "renovado", "para_recuperar")
+WORDS = (
+    "apartamento moradia luminoso renovado varanda garagem terraco vista "
+    "mar rio centro cozinha equipada suite arrecadacao piscina jardim "
+    "condominio fechado metro escolas comercio transportes sossegado "
+    "remodelado duplex lareira sotao logradouro quintal"
+).split()
+
+
+def _format_time(date: datetime) -> str:
+    return date.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+
+class SyntheticSite:
+    """
+    Deterministic generator of the houses of a website.
+    Thread safe
+    """
+
+    def __init__(
+        self,
+        houses: int = 10000,
+        new_rate: float = 0.01,
+        price_change_rate: float = 0.02,
+        delist_rate: float = 0.01,
+        seed: int = 0,
+        epoch_interval_sec: float = 1800,
+    ):
+        """
+        Constructor
+
+        Args:
+            houses (int, optional): number of houses of the first epoch.
+                Defaults to 10000.
+            new_rate (float, optional): new listings added by every epoch,
+                as a fraction of the houses of the first epoch.
+                Defaults to 0.01.
+            price_change_rate (float, optional): probability of a house
+                changing its price in an epoch. Defaults to 0.02.
+            delist_rate (float, optional): probability of a house being
+                delisted in an epoch. Defaults to 0.01.
+            seed (int, optional): seed of the generated data. Defaults to 0.
+            epoch_interval_sec (float, optional): simulated time between
+                epochs. Defaults to 1800, the default check interval.
+        """
+        self.houses = houses
+        self.new_per_epoch = int(round(houses * new_rate))
+        self.price_change_rate = price_change_rate
+        self.delist_rate = delist_rate
+        self.seed = seed
+        self.epoch_interval_sec = epoch_interval_sec
+        self.epoch = 0
+
+        self.lock = threading.Lock()
+        # (epoch, district) -> number of listed houses of every block,
+        # newest first
+        self._block_counts: Dict[tuple, List[int]] = {}
+
+    def _uniform(self, *key) -> float:
+        """
+        Deterministic uniform number in [0, 1) for a key
+        """
+        digest = hashlib.blake2b(
+            repr((self.seed,) + key).encode(), digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "little") / 2**64
+
+    def set_epoch(self, epoch: int):
+        """
+        Move the site to an epoch
+        """
+        with self.lock:
+            self.epoch = epoch
+
+    def num_houses(self, epoch: int = None) -> int:
+        """
+        Number of houses ever listed up to an epoch, including the delisted
+        """
+        epoch = self.epoch if epoch is None else epoch
+        return self.houses + epoch * self.new_per_epoch
+
+    def created_epoch(self, house_id: int) -> int:
+        """
+        Epoch in which a house was listed
+        """
+        if house_id < self.houses or not self.new_per_epoch:
+            return 0
+        return 1 + (house_id - self.houses) // self.new_per_epoch
+
+    def created_time(self, house_id: int) -> datetime:
+        """
+        Simulated time in which a house was listed
+        """
+        epoch = self.created_epoch(house_id)
+        if epoch == 0:
+            seconds = (house_id - self.houses + 1) * LISTING_INTERVAL_SEC
+        else:
+            position = (house_id - self.houses) % self.new_per_epoch + 1
+            seconds = (epoch - 1) * self.epoch_interval_sec + (
+                position * self.epoch_interval_sec / self.new_per_epoch
+            )
+        return START_TIME + timedelta(seconds=seconds)
+
+    def epoch_time(self, epoch: int) -> datetime:
+        """
+        Simulated time of the start of an epoch
+        """
+        return START_TIME + timedelta(seconds=epoch * self.epoch_interval_sec)
+
+    def delisted_epoch(self, house_id: int) -> float:
+        """
+        Epoch in which a house is delisted, infinity if never
+        """
+        if self.delist_rate <= 0:
+            return math.inf
+        if self.delist_rate >= 1:
+            return self.created_epoch(house_id) + 1
+        # Geometric number of epochs until the house is delisted
+        uniform = self._uniform(house_id, "delist")
+        epochs = math.ceil(
+            math.log(1 - uniform) / math.log(1 - self.delist_rate)
+        )
+        return self.created_epoch(house_id) + max(epochs, 1)
+
+    def is_listed(self, house_id: int, epoch: int = None) -> bool:
+        """
+        Whether a house is listed in an epoch
+        """
+        epoch = self.epoch if epoch is None else epoch
+        return 0 <= house_id < self.num_houses(epoch) and (
+            self.delisted_epoch(house_id) > epoch
+        )
+
+    def _listing_ids(self, epoch: int, district: int = None) -> range:
+        """
+        Ids of the houses listed up to an epoch, including the delisted,
+        newest first. The houses of a district are the ones whose id modulo
+        the number of districts is the district
+        """
+        highest = self.num_houses(epoch) - 1
+        if district is None:
+            return range(highest, -1, -1)
+        highest -= (highest - district) % len(DISTRICTS)
+        return range(highest, -1, -len(DISTRICTS))
+
+    def _block_ids(
+        self, block: int, epoch: int, district: int = None
+    ) -> range:
+        return self._listing_ids(epoch, district)[
+            block * BLOCK_SIZE : (block + 1) * BLOCK_SIZE
+        ]
+
+    def _get_block_counts(
+        self, epoch: int, blocks: int, district: int = None
+    ) -> List[int]:
+        """
+        Get the number of listed houses of the newest blocks of an epoch
+        """
+        with self.lock:
+            counts = self._block_counts.setdefault((epoch, district), [])
+            total_blocks = math.ceil(
+                len(self._listing_ids(epoch, district)) / BLOCK_SIZE
+            )
+            while len(counts) < min(blocks, total_blocks):
+                block_ids = self._block_ids(len(counts), epoch, district)
+                if epoch == 0 or self.delist_rate <= 0:
+                    counts.append(len(block_ids))
+                else:
+                    counts.append(
+                        sum(
+                            self.is_listed(house_id, epoch)
+                            for house_id in block_ids
+                        )
+                    )
+            return counts
+
+    def num_listed(self, epoch: int = None, district: int = None) -> int:
+        """
+        Number of houses listed in an epoch, in a district or in all of them
+        """
+        epoch = self.epoch if epoch is None else epoch
+        return sum(
+            self._get_block_counts(epoch, math.inf, district)  # type: ignore
+        )
+
+    def listing(
+        self, offset: int, limit: int, epoch: int = None, district: int = None
+    ) -> List[int]:
+        """
+        Get a page of the ids of the listed houses, newest first
+        """
+        epoch = self.epoch if epoch is None else epoch
+        block = 0
+        while True:
+            counts = self._get_block_counts(epoch, block + 1, district)
+            if block >= len(counts):
+                return []
+            if offset < counts[block]:
+                break
+            offset -= counts[block]
+            block += 1
+
+        ids: List[int] = []
+        while len(ids) < limit and block < len(counts):
+            listed = [
+                house_id
+                for house_id in self._block_ids(block, epoch, district)
+                if self.is_listed(house_id, epoch)
+            ]
+            ids.extend(listed[offset : offset + limit - len(ids)])
+            offset = 0
+            block += 1
+            counts = self._get_block_counts(epoch, block + 1, district)
+        return ids
+
+    def house(self, house_id: int, epoch: int = None) -> dict:
+        """
+        Get the provider independent data of a house in an epoch
+        """
+        epoch = self.epoch if epoch is None else epoch
+        rng = random.Random(self.seed * 1000003 + house_id)
+        rooms = rng.randint(0, 5)
+        util_area = round(rng.uniform(25, 60) + rooms * rng.uniform(15, 30), 1)
+        district = DISTRICTS[house_id % len(DISTRICTS)]
+        base_price = util_area * rng.uniform(1500, 5000)
+
+        # Every price change moves the price between -10% and +5%
+        created_epoch = self.created_epoch(house_id)
+        price = base_price
+        modified = self.created_time(house_id)
+        for change_epoch in range(created_epoch + 1, epoch + 1):
+            draw = self._uniform(house_id, "price", change_epoch)
+            if draw < self.price_change_rate:
+                delta = self._uniform(house_id, "delta", change_epoch)
+                price *= 0.9 + 0.15 * delta
+                modified = self.epoch_time(change_epoch)
+
+        return {
+            "id": house_id,
+            "rooms": rooms,
+            "bathrooms": max(1, rooms - rng.randint(0, 2)),
+            "util_area": util_area,
+            "brute_area": round(util_area * rng.uniform(1.05, 1.3), 1),
+            "condition": rng.randrange(len(OLX_CONDITIONS)),
+            "price": int(price // 1000 * 1000),
+            "latitude": round(rng.uniform(37.0, 42.0), 6),
+            "longitude": round(rng.uniform(-9.5, -6.2), 6),
+            "district": district,
+            "title": f"T{rooms} {' '.join(rng.sample(WORDS, 3))} {district}",
+            "description": " ".join(
+                rng.choice(WORDS) for _ in range(rng.randint(20, 80))
+            ),
+            "created": self.created_time(house_id),
+            "modified": modified,
+            "user_id": rng.randint(1, 100000),
+        }
+
+    def imovirtual_listing_page(
+        self, base_url: str, page: int, per_page: int, district: int = None
+    ) -> str:
+        """
+        Get an Imovirtual-style search page, newest first
+        """
+        num_pages = max(
+            1, math.ceil(self.num_listed(district=district) / per_page)
+        )
+        articles = "\n".join(
+            f'<article data-url="{base_url}/en/anuncio/ID{house_id}">'
+            "</article>"
+            for house_id in self.listing(
+                (page - 1) * per_page, per_page, district=district
+            )
+        )
+        pager = ""
+        if num_pages > 1:
+            # The scrapper reads the last page from the sibling of pager-next
+            pager = (
+                '<ul class="pager">'
+                f'<li><a href="#">{num_pages}</a></li>\n'
+                '<li class="pager-next"><a href="#">Next</a></li></ul>'
+            )
+        return f"<html><body>{articles}{pager}</body></html>"
+
+    def imovirtual_house_page(self, house_id: int) -> str:
+        """
+        Get an Imovirtual-style house page
+        """
+        house = self.house(house_id)
+        condition = IMOVIRTUAL_CONDITIONS[
+            house["condition"] % len(IMOVIRTUAL_CONDITIONS)
+        ]
+        characteristics = {
+            "price": str(house["price"]),
+            "m": str(house["util_area"]),
+            "gross_area": str(house["brute_area"]),
+            "price_per_m": str(int(house["price"] / house["util_area"])),
+            "rooms_num": str(house["rooms"]),
+            "bathrooms_num": str(house["bathrooms"]),
+            "construction_status": condition,
+        }
+        ad = {
+            "id": house_id,
+            "advertType": "PRIVATE",
+            "exclusiveOffer": False,
+            "title": house["title"],
+            "description": house["description"],
+            "features": [],
+            "category": {"name": [{"value": "Apartamento"}]},
+            "createdAt": _format_time(house["created"]),
+            "modifiedAt": _format_time(house["modified"]),
+            "characteristics": [
+                {"key": key, "value": value}
+                for key, value in characteristics.items()
+            ],
+            "location": {
+                "coordinates": {
+                    "latitude": house["latitude"],
+                    "longitude": house["longitude"],
+                },
+                "address": {
+                    "province": {"name": house["district"]},
+                    "city": {"name": house["district"]},
+                },
+            },
+        }
+        next_data = json.dumps({"props": {"pageProps": {"ad": ad}}})
+        return (
+            "<html><body>"
+            f'<script id="__NEXT_DATA__" type="application/json">{next_data}'
+            "</script></body></html>"
+        )
+
+    def olx_offer(self, base_url: str, house_id: int) -> dict:
+        """
+        Get an OLX-style offer
+        """
+        house = self.house(house_id)
+        created = _format_time(house["created"])
+        params = [
+            (
+                "price",
+                {"value": house["price"], "label": f"{house['price']} €"},
+            ),
+            ("tipologia", {"key": f"t{house['rooms']}"}),
+            ("area_util", {"key": str(int(house["util_area"]))}),
+            ("area_bruta", {"key": str(int(house["brute_area"]))}),
+            ("casas_de_banho", {"key": str(house["bathrooms"])}),
+            ("estado", {"key": OLX_CONDITIONS[house["condition"]]}),
+        ]
+        return {
+            "id": house_id,
+            "url": f"{base_url}/d/anuncio/ID{house_id}.html",
+            "title": house["title"],
+            "description": house["description"],
+            "status": "active",
+            "created_time": created,
+            "last_refresh_time": _format_time(house["modified"]),
+            "pushup_time": created,
+            "valid_to_time": _format_time(OLX_VALID_TO_TIME),
+            "promotion": {
+                "highlighted": False,
+                "urgent": False,
+                "top_ad": False,
+                "options": [],
+                "b2c_ad_page": False,
+            },
+            "params": [{"key": key, "value": value} for key, value in params],
+            "user": {"id": house["user_id"], "created": created},
+            "map": {"lat": house["latitude"], "lon": house["longitude"]},
+            "location": {
+                "city": {"name": house["district"]},
+                "region": {"name": house["district"]},
+            },
+            "photos": [{"link": f"{base_url}/photos/{house_id}.jpg"}],
+            "category": {"id": 16, "type": "real_estate"},
+        }
+
+    def olx_offers(
+        self, base_url: str, offset: int, limit: int, district: int = None
+    ) -> dict:
+        """
+        Get an OLX-style page of offers, newest first
+        """
+        return {
+            "data": [
+                self.olx_offer(base_url, house_id)
+                for house_id in self.listing(offset, limit, district=district)
+            ],
+            "metadata": {
+                "visible_total_count": self.num_listed(district=district)
+            },
+        }
+
+    @staticmethod
+    def olx_regions() -> dict:
+        """
+        Get the OLX-style list of regions
+        """
+        return {
+            "data": [
+                {"id": district + 1, "name": name}
+                for district, name in enumerate(DISTRICTS)
+            ]
+        }
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """
+    Routes the requests to the SyntheticSite of the server
+    """
+
+    server: "_StandInHTTPServer"
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        LOGGER.debug(format, *args)
+
+    def _send(self, status: int, body: str = "", content_type="text/html"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Handle a GET request
+        """
+        stand_in = self.server.stand_in
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        site = stand_in.site
+
+        if url.path == CONTROL_PATH:
+            if "set" in query:
+                site.set_epoch(int(query["set"]))
+            self._send(
+                200,
+                json.dumps({"epoch": site.epoch, "houses": site.num_houses()}),
+                "application/json",
+            )
+            return
+
+        status = stand_in.injected_status()
+        if status is not None:
+            self._send(status)
+            return
+
+        base_url = f"http://{self.headers['Host']}"
+        try:
+            if url.path.startswith(IMOVIRTUAL_PREFIX + "/en/anuncio/ID"):
+                house_id = int(url.path.rsplit("ID", 1)[1])
+                if not site.is_listed(house_id):
+                    self._send(410 if house_id < site.num_houses() else 404)
+                    return
+                self._send(200, site.imovirtual_house_page(house_id))
+            elif url.path.startswith(IMOVIRTUAL_PREFIX + "/en/comprar/"):
+                slug = url.path[len(IMOVIRTUAL_PREFIX + "/en/comprar/") :]
+                slug = slug.strip("/")
+                if slug and slug not in DISTRICT_SLUGS:
+                    self._send(404)
+                    return
+                self._send(
+                    200,
+                    site.imovirtual_listing_page(
+                        base_url + IMOVIRTUAL_PREFIX,
+                        int(query.get("page", 1)),
+                        int(query.get("nrAdsPerPage", 72)),
+                        DISTRICT_SLUGS[slug] if slug else None,
+                    ),
+                )
+            elif url.path == OLX_PREFIX + "/api/v1/offers/":
+                region_id = int(query.get("region_id", 0))
+                if not 0 <= region_id <= len(DISTRICTS):
+                    self._send(404)
+                    return
+                self._send(
+                    200,
+                    json.dumps(
+                        site.olx_offers(
+                            base_url + OLX_PREFIX,
+                            int(query.get("offset", 0)),
+                            int(query.get("limit", 40)),
+                            region_id - 1 if region_id else None,
+                        )
+                    ),
+                    "application/json",
+                )
+            elif url.path == OLX_PREFIX + "/api/v1/regions/":
+                self._send(
+                    200, json.dumps(site.olx_regions()), "application/json"
+                )
+            else:
+                self._send(404)
+        except ValueError:
+            self._send(400)
+
+
+class _StandInHTTPServer(ThreadingHTTPServer):
+    # The collector opens a connection per request from many threads
+    request_queue_size = 1024
+    daemon_threads = True
+    stand_in: "StandInServer"
+
+
+class StandInServer:
+    """
+    HTTP server of a SyntheticSite, running on a background thread.
+
+    The Imovirtual pages are served under IMOVIRTUAL_PREFIX and the OLX API
+    under OLX_PREFIX, so the scrappers are created with
+    ImovirtualScrapper(server.url + IMOVIRTUAL_PREFIX) and
+    OlxScrapper(server.url + OLX_PREFIX)
+    """
+
+    def __init__(
+        self,
+        site: SyntheticSite,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0.0,
+        rate_429: float = 0.0,
+        rate_5xx: float = 0.0,
+    ):
+        """
+        Constructor
+
+        Args:
+            site (SyntheticSite): the site served
+            host (str, optional): host to listen on. Defaults to "127.0.0.1".
+            port (int, optional): port to listen on, 0 for any free port.
+                Defaults to 0.
+            latency_ms (float, optional): mean latency added to every
+                response. Defaults to 0.0.
+            rate_429 (float, optional): fraction of the requests answered
+                with a 429. Defaults to 0.0.
+            rate_5xx (float, optional): fraction of the requests answered
+                with a 5xx. Defaults to 0.0.
+        """
+        self.site = site
+        self.latency_ms = latency_ms
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.http_server = _StandInHTTPServer((host, port), _StandInHandler)
+        self.http_server.stand_in = self
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """
+        URL of the server
+        """
+        host, port = self.http_server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def injected_status(self) -> Optional[int]:
+        """
+        Wait the injected latency and draw the injected error of a request
+
+        Returns:
+            Optional[int]: the status code of the error, None for no error
+        """
+        if self.latency_ms > 0:
+            time.sleep(random.uniform(0, 2 * self.latency_ms) / 1000)
+        draw = random.random()
+        if draw < self.rate_429:
+            return 429
+        if draw < self.rate_429 + self.rate_5xx:
+            return random.choice(ERROR_STATUS_CODES)
+        return None
+
+    def start(self) -> "StandInServer":
+        """
+        Start serving on a background thread
+        """
+        self.thread = threading.Thread(
+            target=self.http_server.serve_forever, name="StandIn", daemon=True
+        )
+        self.thread.start()
+        LOGGER.info("Stand-in server listening on %s", self.url)
+        return self
+
+    def stop(self):
+        """
+        Stop the server
+        """
+        self.http_server.shutdown()
+        self.http_server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """
+    Add the arguments of the site and of the server to a parser
+    """
+    parser.add_argument("--houses", default=10000, type=int)
+    parser.add_argument("--new_rate", default=0.01, type=float)
+    parser.add_argument("--price_change_rate", default=0.02, type=float)
+    parser.add_argument("--delist_rate", default=0.01, type=float)
+    parser.add_argument("--seed", default=0, type=int)
+    parser.add_argument("--latency_ms", default=0.0, type=float)
+    parser.add_argument("--rate_429", default=0.0, type=float)
+    parser.add_argument("--rate_5xx", default=0.0, type=float)
+
+
+def create_server(parsed_args, host: str = "127.0.0.1", port: int = 0):
+    """
+    Create a StandInServer from the arguments of add_arguments
+    """
+    site = SyntheticSite(
+        houses=parsed_args.houses,
+        new_rate=parsed_args.new_rate,
+        price_change_rate=parsed_args.price_change_rate,
+        delist_rate=parsed_args.delist_rate,
+        seed=parsed_args.seed,
+    )
+    return StandInServer(
+        site,
+        host=host,
+        port=port,
+        latency_ms=parsed_args.latency_ms,
+        rate_429=parsed_args.rate_429,
+        rate_5xx=parsed_args.rate_5xx,
+    )
+
+
+def main():
+    """
+    Serve a synthetic site until interrupted
+    """
+    parser = argparse.ArgumentParser(
+        description="Local stand-in of the websites for load tests"
+    )
+    parser.add_argument("--host", default="127.0.0.1", type=str)
+    parser.add_argument("--port", default=8000, type=int)
+    add_arguments(parser)
+    parsed_args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    server = create_server(parsed_args, parsed_args.host, parsed_args.port)
+    LOGGER.info(
+        "Serving %s and %s, set the epoch with %s?set=<epoch>",
+        server.url + IMOVIRTUAL_PREFIX,
+        server.url + OLX_PREFIX,
+        server.url + CONTROL_PATH,
+    )
+    try:
+        server.http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.http_server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+This module defines the interface that shall be
+implemented by the storage backends
+"""
+
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+
+from house_collector.events import EventSink
+from house_collector.normalization import PRICE_CENTS_FIELD
+
+STORAGE_MONGO = "mongo"
+STORAGE_SQLITE = "sqlite"
+STORAGE_TYPES = (STORAGE_MONGO, STORAGE_SQLITE)
+
+# When the house was last fetched and when its price last changed
+LAST_CHECKED_FIELD = "last_checked"
+PRICE_CHANGED_AT_FIELD = "price_changed_at"
+# When the listing of the house expires, see WebsiteScrapper.get_house_expiry
+EXPIRES_AT_FIELD = "expires_at"
+
+
+class StorageBackend:
+    """
+    Storage of the houses, implementations must be thread safe.
+    Every provider has its own collection (table) named after the provider.
+    If event_sink is set, the writes must emit the events of events.py
+    """
+
+    event_sink: Optional[EventSink] = None
+
+    def insert_house(self, data: dict, collection_name: str):
+        """
+        Insert a house, if the house already exists it will be updated.
+        Must call track_price_change with the previous version of the house
+        """
+        raise NotImplementedError()
+
+    def set_house_unavailable(self, link: str, collection_name: str):
+        """
+        Mark a house as no longer available,
+        returns its id or None if it was not available
+        """
+        raise NotImplementedError()
+
+    def get_latest_house(self, collection_name: str) -> Optional[dict]:
+        """
+        Get the house with the most recent date_modified
+        """
+        raise NotImplementedError()
+
+    def get_crawl_state(self, collection_name: str) -> dict:
+        """
+        Get the state saved by the last run of a provider
+        """
+        raise NotImplementedError()
+
+    def set_crawl_state(self, collection_name: str, state: dict):
+        """
+        Save the state of the run of a provider
+        """
+        raise NotImplementedError()
+
+    def insert_dead_letter(
+        self, link: str, collection_name: str, error: str, attempts: int
+    ):
+        """
+        Park a house that could not be processed
+        """
+        raise NotImplementedError()
+
+    def get_dead_letters(self, collection_name: str) -> List[str]:
+        """
+        Get the links of the dead letters of a provider
+        """
+        raise NotImplementedError()
+
+    def remove_dead_letters(self, collection_name: str, links: List[str]):
+        """
+        Remove dead letters that were processed successfully
+        """
+        raise NotImplementedError()
+
+    def ensure_indexes(self, collection_name: str):
+        """
+        Create the indexes used by the queries, if they do not exist
+        """
+        raise NotImplementedError()
+
+    def get_houses_to_recheck(
+        self,
+        collection_name: str,
+        checked_before: datetime,
+        limit: int,
+        changed_after: datetime = None,
+    ) -> List[dict]:
+        """
+        Get the available houses not checked since a date, or never checked,
+        least recently checked first. If changed_after is set, only the houses
+        whose price changed after it
+        """
+        raise NotImplementedError()
+
+    def get_expired_houses(
+        self, collection_name: str, now: datetime
+    ) -> List[dict]:
+        """
+        Get the available houses whose listing expired before now
+        """
+        raise NotImplementedError()
+
+    def get_houses(
+        self,
+        collection_name: str,
+        typology: int = None,
+        min_price: float = None,
+        max_price: float = None,
+        condition: str = None,
+        limit: int = None,
+    ) -> List[dict]:
+        """
+        Get the available houses that match the canonical fields
+        of normalization.py, cheapest first
+        """
+        raise NotImplementedError()
+
+    def get_houses_in_radius(
+        self,
+        collection_name: str,
+        latitude: float,
+        longitude: float,
+        radius_m: float,
+        typology: int = None,
+        min_price: float = None,
+        max_price: float = None,
+    ) -> List[dict]:
+        """
+        Get every available house within a radius of a location
+        """
+        raise NotImplementedError()
+
+    def get_nearest_houses(
+        self,
+        collection_name: str,
+        latitude: float,
+        longitude: float,
+        k: int = 10,
+        typology: int = None,
+        min_price: float = None,
+        max_price: float = None,
+        max_distance_m: float = None,
+    ) -> List[dict]:
+        """
+        Get the k nearest available houses to a location, nearest first,
+        with the distance in meters in the "distance" field
+        """
+        raise NotImplementedError()
+
+    def get_houses_with_location(
+        self, collection_name: str, projection: dict = None
+    ) -> Iterator[dict]:
+        """
+        Iterate over every available house with coordinates
+        """
+        raise NotImplementedError()
+
+    def flush(self):
+        """
+        Make the pending writes durable
+        """
+
+    def close(self):
+        """
+        Flush and close the storage
+        """
+        raise NotImplementedError()
+
+
+def track_price_change(old_record: Optional[dict], new_record: dict):
+    """
+    Set the price_changed_at of a house being written over its previous
+    version, if its canonical price changed
+    """
+    if old_record is None or PRICE_CENTS_FIELD not in old_record:
+        return
+    if new_record.get(PRICE_CENTS_FIELD, old_record[PRICE_CENTS_FIELD]) != (
+        old_record[PRICE_CENTS_FIELD]
+    ):
+        new_record[PRICE_CHANGED_AT_FIELD] = datetime.now(timezone.utc)
+
+
+def create_storage(
+    storage_type: str,
+    db_host: str = None,
+    db_port: int = None,
+    sqlite_path: str = None,
+) -> StorageBackend:
+    """
+    Create a storage backend
+
+    Args:
+        storage_type (str): one of STORAGE_TYPES
+        db_host (str, optional): MongoDB host. Defaults to None.
+        db_port (int, optional): MongoDB port. Defaults to None.
+        sqlite_path (str, optional): SQLite database file. Defaults to None.
+
+    Raises:
+        ValueError: if the storage type is unknown
+
+    Returns:
+        StorageBackend: the storage
+    """
+    # Imported here so the SQLite backend does not require pymongo
+    # pylint: disable=import-outside-toplevel
+    if storage_type == STORAGE_MONGO:
+        from house_collector.db_handler import DBHandler
+
+        return DBHandler(host=db_host, port=db_port)
+    if storage_type == STORAGE_SQLITE:
+        from house_collector.sqlite_handler import SQLiteHandler
+
+        return SQLiteHandler(sqlite_path)
+    # pylint: enable=import-outside-toplevel
+    raise ValueError(f"Unknown storage {storage_type}")
@@ -2,39 +2,111 @@
 
 import logging
 import time
+from datetime import datetime, timezone
 
 import requests
 
 LOGGER = logging.getLogger("utils")
 
+# Status codes that will not change by retrying
+GONE_STATUS_CODES = (404, 410)
+# Seconds to wait before retrying a failed request, doubled on every retry
+RETRY_DELAY_SEC = 3
+POST_RETRY_DELAY_SEC = 10
+MAX_RETRY_DELAY_SEC = 60
+# Number of retries of a failed request before giving up
+MAX_RETRIES = 5
 
-def get_until_success(*args, **kwargs):
+
+class RetriesExhaustedError(requests.RequestException):
     """
-    Make a get request until it succeeds
-    The arguments will be passed directly to requests.get
+    A request kept failing (e.g. 429 or 5xx) after every retry.
+    Not an HTTPError, the page may still exist
     """
-    page = requests.get(*args, **kwargs, timeout=10)
+
+
+def _request_until_success(
+    method,
+    args,
+    kwargs,
+    max_retries: int,
+    retry_delay: float,
+    gone_status_codes=(),
+):
+    page = method(*args, **kwargs, timeout=10)
+    retries = 0
     while page.status_code != 200:
+        if page.status_code in gone_status_codes:
+            page.raise_for_status()
+        if retries >= max_retries:
+            raise RetriesExhaustedError(
+                f"Request failed with status code {page.status_code} "
+                f"after {retries} retries",
+                response=page,
+            )
+        delay = min(retry_delay * 2**retries, MAX_RETRY_DELAY_SEC)
         LOGGER.warning(
-            "Request failed with status code %d. Retrying...",
+            "Request failed with status code %d. Retrying in %.1fs...",
             page.status_code,
+            delay,
         )
-        time.sleep(3)
-        page = requests.get(*args, **kwargs, timeout=10)
+        time.sleep(delay)
+        retries += 1
+        page = method(*args, **kwargs, timeout=10)
     return page
 
 
-def post_until_success(*args, **kwargs):
+def get_until_success(*args, max_retries: int = None, **kwargs):
     """
-    Make a post request until it succeeds
-    The arguments will be passed directly to requests.post
+    Make a get request until it succeeds, waiting twice as long
+    before every retry
+    The other arguments will be passed directly to requests.get
+
+    Args:
+        max_retries (int, optional): retries before giving up.
+            Defaults to MAX_RETRIES.
+
+    Raises:
+        requests.HTTPError: if the page does not exist (404 or 410)
+        RetriesExhaustedError: if the request still fails after max_retries
     """
-    page = requests.post(*args, **kwargs, timeout=10)
-    while page.status_code != 200:
-        LOGGER.warning(
-            "Request failed with status code %d. Retrying...",
-            page.status_code,
-        )
-        time.sleep(10)
-        page = requests.post(*args, **kwargs, timeout=10)
-    return page
+    return _request_until_success(
+        requests.get,
+        args,
+        kwargs,
+        MAX_RETRIES if max_retries is None else max_retries,
+        RETRY_DELAY_SEC,
+        GONE_STATUS_CODES,
+    )
+
+
+def post_until_success(*args, max_retries: int = None, **kwargs):
+    """
+    Make a post request until it succeeds, waiting twice as long
+    before every retry
+    The other arguments will be passed directly to requests.post
+
+    Args:
+        max_retries (int, optional): retries before giving up.
+            Defaults to MAX_RETRIES.
+
+    Raises:
+        RetriesExhaustedError: if the request still fails after max_retries
+    """
+    return _request_until_success(
+        requests.post,
+        args,
+        kwargs,
+        MAX_RETRIES if max_retries is None else max_retries,
+        POST_RETRY_DELAY_SEC,
+    )
+
+
+def to_utc(date: datetime) -> datetime:
+    """
+    Convert a datetime to an aware UTC datetime,
+    naive datetimes (as returned by pymongo) are assumed to be in UTC
+    """
+    if date.tzinfo is None:
+        return date.replace(tzinfo=timezone.utc)
+    return date.astimezone(timezone.utc)
@@ -4,5 +4,11 @@ setup(
     name="house_collector",
     version="0.1.0",
     description="Collects houses from different websites",
-    packages=['house_collector']
+    packages=['house_collector'],
+    entry_points={
+        "house_collector.scrappers": [
+            "imovirtual = house_collector.imovirtual_scrapper:ImovirtualScrapper",
+            "olx = house_collector.olx_scrapper:OlxScrapper",
+        ],
+    },
 )